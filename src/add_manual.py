@@ -10,6 +10,7 @@ Author: Kunal Sinha
 Course: CS410 - Text Information Systems (Fall 2025), UIUC
 """
 
+import os
 import argparse
 from manual_tools import add_manual, find_all_pdfs
 
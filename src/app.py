@@ -11,16 +11,25 @@ Author: Kunal Sinha
 Course: CS410 - Text Information Systems (Fall 2025), UIUC
 """
 
-import os
+import functools
 import streamlit as st
-import subprocess
 
-from search_engine import search, find_pdf_recursive, detect_car_make
+from search_engine import (
+    search, find_pdf_recursive, detect_car_make, more_like_this,
+    correct_query, suggest_completions,
+)
 from query_normalizer import normalize_query
-from manual_tools import add_manual
-from config import MANUALS_ROOT
+from search_trace import SearchTrace
+from snippets import make_snippet, highlight_markdown
+from dense_index import dense_available
+import query_log
+
+query_log.set_source("app")
+
+# Facet columns next to the results, and values listed per facet
+FACET_TITLES = {"make": "Make", "model": "Model", "source_pdf": "Manual"}
+FACETS_SHOWN = 5
 
-from tfidf_indexer import main as build_index
 
 
 # STREAMLIT PAGE SETTINGS
@@ -34,25 +43,104 @@ st.title("AutoAssist - Vehicle Troubleshooting Assistant")
 
 st.header("Diagnose a Car Problem")
 
-query = st.text_input("Describe your car problem:")
+def complete_query(term):
+    """Replace the word being typed with the chosen completion."""
+    words = st.session_state["query"].split()
+    st.session_state["query"] = " ".join(words[:-1] + [term]) + " "
+
+
+def use_query(text):
+    """Search for the suggested spelling instead."""
+    st.session_state["query"] = text
+    st.session_state["diagnosed"] = text
+    st.session_state["filters"] = {}
+
+
+def set_filter(field, value):
+    """Narrow the current search to one make, model or manual."""
+    st.session_state["filters"][field] = value
+
+
+def clear_filters():
+    st.session_state["filters"] = {}
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_pdf(make, pdf_name):
+    """
+    find_pdf_recursive() walks the whole manuals tree, so look each manual
+    up once. The cache lives for one script run, which picks up manuals
+    added since the last one.
+    """
+    return find_pdf_recursive(make, pdf_name)
+
+
+query = st.text_input("Describe your car problem:", key="query")
 
+# Type-ahead: completions of the last word, from the index vocabulary
+completions = suggest_completions(query)
+if completions:
+    for col, term in zip(st.columns(len(completions)), completions):
+        col.button(term, key=f"complete-{term}", on_click=complete_query, args=(term,))
+
+# Semantic ranking is only offered once a dense index has been built
+retrieval = "tfidf"
+if dense_available():
+    ranking = st.radio("Ranking", ["Keyword", "Hybrid", "Semantic"], horizontal=True)
+    retrieval = {"Keyword": "tfidf", "Hybrid": "hybrid", "Semantic": "dense"}[ranking]
+
+# The search stays on screen across reruns, so facet buttons can narrow it
 if st.button("Diagnose"):
+    st.session_state["diagnosed"] = query
+    st.session_state["filters"] = {}
+
+if st.session_state.get("diagnosed") is not None:
+    query = st.session_state["diagnosed"]
+    filters = st.session_state["filters"]
     if not query.strip():
         st.warning("Please enter a problem description.")
         st.stop()
 
-    normalized = normalize_query(query)
+    trace = SearchTrace(query)
+
+    # Corrections are offered, never applied behind the user's back
+    with trace.stage("correct_spelling"):
+        corrected, corrections = correct_query(query)
+    if corrections:
+        st.button(f"Did you mean: {corrected}", on_click=use_query, args=(corrected,))
+
+    with trace.stage("normalize_query"):
+        normalized = normalize_query(query)
     st.write("### Normalized Query")
     st.code(normalized)
 
-    detected_make = detect_car_make(normalized)
+    with trace.stage("detect_car_make"):
+        detected_make = detect_car_make(normalized)
     if detected_make:
         st.write(f"**Detected Manufacturer:** {detected_make.title()}")
         st.success(f"Boosting results for: {detected_make.title()}")
     else:
         st.info("No manufacturer detectedm, ranking unboosted.")
 
-    results = search(normalized, top_k=5, car_make=detected_make)
+    facets = {}
+    results = search(normalized, top_k=5, car_make=detected_make, trace=trace,
+                     collapse_pages=True, retrieval=retrieval, rerank=True,
+                     raw_query=query, filters=filters, facets=facets)
+
+    # Where the matching passages are, with one-click narrowing
+    st.write(f"**{facets['hits']} matching passages**")
+    active = {field: value for field, value in filters.items() if value}
+    if active:
+        st.write("Narrowed to: " + ", ".join(active.values()))
+        st.button("Clear filters", on_click=clear_filters)
+    for col, (field, title) in zip(st.columns(3), FACET_TITLES.items()):
+        with col:
+            st.caption(title)
+            for label, count in facets[field][:FACETS_SHOWN]:
+                share = count / facets["hits"]
+                st.button(f"{label} ({count}, {share:.0%})", key=f"facet-{field}-{label}",
+                          on_click=set_filter, args=(field, label),
+                          disabled=filters.get(field) == label)
 
     if not results:
         st.error("No results found.")
@@ -65,21 +153,43 @@ if st.button("Diagnose"):
         st.write(f"**Model:** {r['model']}")
         st.write(f"**Manual:** {r['source_pdf']}")
         st.write(f"**Score:** {r['score']:.4f}")
+        if r.get("page_hits", 1) > 1:
+            st.write(f"**Matches:** {r['page_hits']} passages on this page")
 
-        excerpt = r["text"][:350].replace("\n", " ") + "..."
-        st.write(f"**Excerpt:** {excerpt}")
+        excerpt, spans = make_snippet(r["text"], normalized, width=350)
+        st.markdown(f"**Excerpt:** {highlight_markdown(excerpt, spans)}")
 
         # Clickable PDF link
         
         st.write("**Open full instructions in the service manual:**")
 
-        pdf_path = find_pdf_recursive(r["make"], r["source_pdf"])
+        with trace.stage("find_pdf_recursive"):
+            pdf_path = resolve_pdf(r["make"], r["source_pdf"])
         if pdf_path:
             st.markdown(f"[Open PDF]({pdf_path})")
             st.write(f"**Page Number:** {r['page_number']}")
         else:
             st.warning("PDF not found.")
 
+        related = more_like_this(r["doc_id"])
+        if related:
+            with st.expander("Related pages in other manuals"):
+                for rel in related:
+                    line = (f"{rel['make'].title()} {rel['model']} - {rel['source_pdf']}, "
+                            f"page {rel['page_number']} (similarity {rel['score']:.2f})")
+                    rel_path = resolve_pdf(rel["make"], rel["source_pdf"])
+                    st.markdown(f"- [{line}]({rel_path})" if rel_path else f"- {line}")
+
+    trace.log()
+
+    with st.expander("Timings"):
+        st.write(f"**Total:** {trace.total_ms():.1f} ms")
+        st.table({
+            "stage": list(trace.stages),
+            "ms": [f"{ms:.2f}" for ms in trace.stages.values()],
+        })
+        st.json(trace.counters)
+
 
 # SECTION 2 - ADDING A NEW MANUAL
 
@@ -105,34 +215,30 @@ if st.button("Add Manual"):
 
     st.info("Processing manuals… this may take a minute.")
 
-    # STEP 1 - Save uploads to temp
+    # STEP 1 - Stream uploads into the manuals store, then extract and
+    # segment them page by page (no temporary copies)
     progress = st.progress(0)
-    temp_paths = []
-
-    for i, f in enumerate(uploaded_files):
-        temp_path = f"temp_{f.name}"
-        with open(temp_path, "wb") as out:
-            out.write(f.read())
-        temp_paths.append(temp_path)
-        progress.progress((i+1) / len(uploaded_files))
-
-    # STEP 2 - Add manual to corpus
     st.write("Extracting text and building passages...")
-    progress.progress(0.3)
 
-    add_manual(make, model, temp_paths)
+    # Ingestion stack (pdfplumber, nltk, scikit-learn) loads only when used
+    from manual_tools import add_manual
+    failed = add_manual(make, model, uploaded_files)
+    if failed:
+        st.error("Could not extract text from: " + ", ".join(failed)
+                 + ". Any passages they had before were kept.")
+        if len(failed) == len(uploaded_files):
+            st.stop()
 
     progress.progress(0.6)
 
-    # STEP 3 - Rebuild TF-IDF index
+    # STEP 2 - Rebuild TF-IDF index
     st.write("Rebuilding TF-IDF index...")
-    from tfidf_indexer import main as build_index
+    from tfidf_indexer import build_index
     build_index()
 
     progress.progress(1.0)
 
-    # Cleanup temps
-    for p in temp_paths:
-        os.remove(p)
-
-    st.success(f"Manual added and index rebuilt! {make.title()} {model.title()} is now searchable.")
+    if failed:
+        st.warning(f"Index rebuilt with the other {len(uploaded_files) - len(failed)} PDF(s).")
+    else:
+        st.success(f"Manual added and index rebuilt! {make.title()} {model.title()} is now searchable.")
@@ -0,0 +1,467 @@
+"""
+Filename: benchmark.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Reproducible performance benchmark for the ingestion and search
+    hot paths. Runs against the passages in data/corpus and against
+    synthetic corpora scaled up to 2x, 5x and 10x the passage count.
+
+    For every scale it measures:
+        - segment_passages.build_passages() per make (1x only)
+        - tfidf_indexer.build_index() end to end
+        - load_index(), normalize_query(), detect_car_make()
+        - search() latency percentiles (p50 / p95 / p99), both plain
+          (search_ms) and as the CLI, app and server call it: detected
+          make, collapsed pages and re-ranking (search_production_ms)
+        - peak resident memory of the process
+
+    It also times a cold `python src/search_engine.py` up to its prompt
+    (target: under STARTUP_TARGET_MS) and a fresh interpreter answering
+    its first query, both against the real index.
+
+    Each scale runs in its own subprocess so peak RSS is not polluted by
+    the previous scale. Results are written as JSON and can be saved as a
+    baseline or compared against one, so regressions show up as numbers.
+
+    Usage:
+        python src/benchmark.py --scales 1 2 5 10 --save-baseline
+        python src/benchmark.py --compare
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+import numpy as np
+
+from config import CORPUS_ROOT
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+DEFAULT_SCALES = [1, 2, 5, 10]
+
+# Metrics where a bigger number is worse (everything else is informational)
+REGRESSION_KEYS = ("_ms", "_s", "_mb", "_us")
+
+# Budget for `python src/search_engine.py` to reach its prompt
+STARTUP_TARGET_MS = 300
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Helpers
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def percentiles(samples):
+    arr = np.asarray(samples, dtype=float)
+    return {
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+    }
+
+
+def time_calls(fn, args_list, repeat=1):
+    """Call fn(*args) for every args tuple, `repeat` times. Returns ms samples."""
+    samples = []
+    for _ in range(repeat):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the print/tqdm chatter of the pipeline scripts."""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def corpus_roots(corpus_root):
+    """
+    Point the pipeline modules at another corpus directory. The modules
+    copy paths out of config at import time, so the module globals are
+    swapped for the duration of the block.
+    """
+    import tfidf_indexer
+    import search_engine
+    import segment_passages
+
+    index_root = os.path.join(corpus_root, "index")
+    saved = (tfidf_indexer.CORPUS_ROOT, tfidf_indexer.INDEX_ROOT,
+             search_engine.INDEX_ROOT, segment_passages.ROOT)
+
+    tfidf_indexer.CORPUS_ROOT = corpus_root
+    tfidf_indexer.INDEX_ROOT = index_root
+    search_engine.INDEX_ROOT = index_root
+    segment_passages.ROOT = corpus_root
+    try:
+        yield
+    finally:
+        (tfidf_indexer.CORPUS_ROOT, tfidf_indexer.INDEX_ROOT,
+         search_engine.INDEX_ROOT, segment_passages.ROOT) = saved
+
+
+# Corpus preparation
+
+def passage_files(corpus_root):
+    """Map make -> passages JSONL path for every make that has one."""
+    files = {}
+    for make in sorted(os.listdir(corpus_root)):
+        path = os.path.join(corpus_root, make, "passages", f"{make}_passages.jsonl")
+        if os.path.exists(path):
+            files[make] = path
+    return files
+
+
+def model_for_make(make):
+    """Reuse the model name from an existing passage file, if there is one."""
+    path = os.path.join(CORPUS_ROOT, make, "passages", f"{make}_passages.jsonl")
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            line = f.readline()
+            if line:
+                return json.loads(line).get("model", make)
+    return make
+
+
+def bench_segmentation(work_root):
+    """
+    Time build_passages() per make over the real raw_text pages. Output
+    goes to work_root so the committed corpus is never rewritten.
+    Returns ({make: seconds}, error message or None).
+    """
+    import segment_passages
+
+    timings = {}
+    for make in sorted(os.listdir(CORPUS_ROOT)):
+        raw_dir = os.path.join(CORPUS_ROOT, make, "raw_text")
+        if not os.path.isdir(raw_dir):
+            continue
+
+        os.makedirs(os.path.join(work_root, make), exist_ok=True)
+        link = os.path.join(work_root, make, "raw_text")
+        try:
+            os.symlink(raw_dir, link, target_is_directory=True)
+        except OSError:
+            shutil.copytree(raw_dir, link)
+
+        with corpus_roots(work_root):
+            start = time.perf_counter()
+            try:
+                with quiet():
+                    segment_passages.build_passages(make, model_for_make(make))
+            except LookupError as e:  # NLTK punkt data not installed
+                lines = [l.strip() for l in str(e).splitlines() if l.strip().strip("*")]
+                return timings, f"segmentation skipped: {lines[0] if lines else 'NLTK data missing'}"
+            timings[make] = time.perf_counter() - start
+
+    return timings, None
+
+
+def write_scaled_corpus(src_files, dst_root, scale, seed=410):
+    """
+    Write a synthetic corpus with `scale` times as many passages. Copy 0 is
+    the original passage; every further copy shuffles the passage words so
+    the bigram vocabulary grows the way a larger real corpus would, and
+    points at a renamed PDF so pages stay distinct.
+    """
+    rng = random.Random(seed)
+    total = 0
+
+    for make, path in src_files.items():
+        out_dir = os.path.join(dst_root, make, "passages")
+        os.makedirs(out_dir, exist_ok=True)
+
+        with open(path, "r", encoding="utf-8") as fin:
+            records = [json.loads(line) for line in fin]
+
+        out_path = os.path.join(out_dir, f"{make}_passages.jsonl")
+        with open(out_path, "w", encoding="utf-8") as fout:
+            for copy in range(scale):
+                for record in records:
+                    if copy:
+                        record = dict(record)
+                        words = record["text"].split()
+                        rng.shuffle(words)
+                        record["text"] = " ".join(words)
+                        stem = record["source_pdf"].rsplit(".", 1)[0]
+                        record["source_pdf"] = f"{stem}_x{copy}.pdf"
+                    fout.write(json.dumps(record) + "\n")
+                    total += 1
+
+    return total
+
+
+# One scale (runs inside a worker subprocess)
+
+def run_scale(scale, repeat, segment):
+    import tfidf_indexer
+    import search_engine
+    from query_normalizer import normalize_query
+    from evaluate import TEST_QUERIES
+
+    result = {"scale": scale}
+    work_root = tempfile.mkdtemp(prefix=f"autoassist_bench_{scale}x_")
+
+    try:
+        src_files = {}
+        if segment and scale == 1:
+            timings, error = bench_segmentation(work_root)
+            result["build_passages_s"] = timings
+            if error:
+                result["build_passages_error"] = error
+            else:
+                src_files = passage_files(work_root)
+
+        if not src_files:
+            src_files = passage_files(CORPUS_ROOT)
+        if not src_files:
+            raise SystemExit("No passage files found under data/corpus; run segment_passages.py first.")
+
+        corpus_root = os.path.join(work_root, "scaled")
+        result["passages"] = write_scaled_corpus(src_files, corpus_root, scale)
+
+        with corpus_roots(corpus_root):
+            start = time.perf_counter()
+            with quiet():
+                tfidf_indexer.build_index()
+            result["tfidf_indexer_main_s"] = time.perf_counter() - start
+
+            def cold_load():
+                search_engine.clear_index_cache()
+                search_engine.load_index()
+
+            result["load_index_ms"] = percentiles(
+                time_calls(cold_load, [()], repeat=max(3, repeat))
+            )
+
+            vectorizer, tfidf_matrix, _ = search_engine.load_index()
+            result["vocabulary"] = len(vectorizer.vocabulary_)
+            result["matrix_nnz"] = int(tfidf_matrix.nnz)
+
+            raw_queries = [(q,) for q in TEST_QUERIES]
+            normalized = [(normalize_query(q),) for q in TEST_QUERIES]
+
+            result["normalize_query_us"] = percentiles(
+                [ms * 1000.0 for ms in time_calls(normalize_query, raw_queries, repeat=100)]
+            )
+            result["detect_car_make_ms"] = percentiles(
+                time_calls(search_engine.detect_car_make, normalized, repeat=repeat)
+            )
+            result["search_ms"] = percentiles(
+                time_calls(search_engine.search, normalized, repeat=repeat)
+            )
+
+            def production_search(raw, query):
+                car_make = search_engine.detect_car_make(raw)
+                search_engine.search(query, top_k=5, car_make=car_make,
+                                     collapse_pages=True, rerank=True)
+
+            result["search_production_ms"] = percentiles(time_calls(
+                production_search, [(q, normalize_query(q)) for q in TEST_QUERIES],
+                repeat=repeat,
+            ))
+
+        result["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    return result
+
+
+def bench_startup(repeat):
+    """Wall-clock ms for fresh interpreters: CLI up to its prompt, and a first search."""
+    cli = [sys.executable, os.path.join(SRC_DIR, "search_engine.py")]
+    first_query = [sys.executable, "-c",
+                   "import search_engine; search_engine.search('engine oil leak')"]
+
+    def run(cmd, stdin=None):
+        subprocess.run(cmd, input=stdin, cwd=SRC_DIR, check=True, text=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    return {
+        "cli_startup_ms": percentiles(time_calls(run, [(cli, "quit\n")], repeat=max(5, repeat))),
+        "first_query_ms": percentiles(time_calls(run, [(first_query,)], repeat=max(5, repeat))),
+    }
+
+
+def run_scale_subprocess(scale, repeat, segment):
+    """Run one scale in a fresh interpreter and collect its JSON result."""
+    fd, out_path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker-scale", str(scale),
+           "--repeat", str(repeat), "--worker-out", out_path]
+    if not segment:
+        cmd.append("--skip-segment")
+    try:
+        subprocess.run(cmd, check=True)
+        with open(out_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(out_path)
+
+
+# Baseline comparison
+
+def flatten(d, prefix=""):
+    flat = {}
+    for key, value in d.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def is_cost_metric(name):
+    return any(part.endswith(REGRESSION_KEYS) for part in name.split("."))
+
+
+def compare(current, baseline, tolerance):
+    """Print a table of changes vs. the baseline. Returns the regressions."""
+    cur = flatten({"startup": current.get("startup", {}), **current["scales"]})
+    base = flatten({"startup": baseline.get("startup", {}), **baseline["scales"]})
+    regressions = []
+
+    print(f"\n{'metric':55} {'baseline':>12} {'current':>12} {'change':>9}")
+    print("-" * 91)
+    for name in sorted(cur):
+        if name not in base or not is_cost_metric(name):
+            continue
+        old, new = base[name], cur[name]
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:55} {old:12.3f} {new:12.3f} {change:+8.1%}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {tolerance:.0%}.")
+    else:
+        print(f"\nNo regressions beyond {tolerance:.0%}.")
+    return regressions
+
+
+def print_summary(report):
+    print(f"\n{'scale':>6} {'passages':>9} {'build s':>9} {'load ms':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'prod p50':>8} {'prod p95':>8} "
+          f"{'RSS MB':>8}")
+    for key, r in report["scales"].items():
+        rss = r["peak_rss_mb"]
+        # Reports from before the production path was timed lack it
+        production = r.get("search_production_ms", {"p50": float("nan"), "p95": float("nan")})
+        print(f"{key:>6} {r['passages']:9d} {r['tfidf_indexer_main_s']:9.2f} "
+              f"{r['load_index_ms']['p50']:9.1f} {r['search_ms']['p50']:8.1f} "
+              f"{r['search_ms']['p95']:8.1f} {r['search_ms']['p99']:8.1f} "
+              f"{production['p50']:8.1f} {production['p95']:8.1f} "
+              f"{rss if rss is not None else float('nan'):8.1f}")
+        for make, secs in r.get("build_passages_s", {}).items():
+            print(f"{'':>6} build_passages({make}): {secs:.2f} s")
+        if "build_passages_error" in r:
+            print(f"{'':>6} {r['build_passages_error']}")
+
+    startup = report.get("startup")
+    if startup:
+        cli = startup["cli_startup_ms"]["p50"]
+        verdict = "OK" if cli < STARTUP_TARGET_MS else "over target"
+        print(f"\nCLI startup p50: {cli:.0f} ms (target < {STARTUP_TARGET_MS} ms, {verdict})")
+        print(f"First query in a fresh process p50: {startup['first_query_ms']['p50']:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AutoAssist pipeline.")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help="Corpus multipliers to benchmark (default: 1 2 5 10)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Repetitions of the query set per measurement")
+    parser.add_argument("--skip-segment", action="store_true",
+                        help="Do not time build_passages() over the raw text")
+    parser.add_argument("--skip-startup", action="store_true",
+                        help="Do not time CLI startup and first query")
+    parser.add_argument("--out", default="bench_results.json", help="Results JSON path")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON path")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store these results as the new baseline")
+    parser.add_argument("--compare", action="store_true",
+                        help="Compare against the baseline and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.20,
+                        help="Allowed slowdown before a metric counts as regressed")
+    parser.add_argument("--worker-scale", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_scale is not None:
+        result = run_scale(args.worker_scale, args.repeat, not args.skip_segment)
+        with open(args.worker_out, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "scales": {},
+    }
+
+    if not args.skip_startup:
+        print("Benchmarking startup...")
+        report["startup"] = bench_startup(args.repeat)
+
+    for scale in args.scales:
+        print(f"Benchmarking {scale}x corpus...")
+        report["scales"][f"{scale}x"] = run_scale_subprocess(scale, args.repeat, not args.skip_segment)
+
+    print_summary(report)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved -> {args.out}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved -> {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+            sys.exit(1)
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
 from manual_tools import add_manual, find_all_pdfs
-from tfidf_indexer import main as rebuild_index
+from tfidf_indexer import build_index as rebuild_index
 from config import MANUALS_ROOT
 
 RAW_ROOT = r"C:\Users\Kunal\Documents\CS 410 Project\Old\autoassist\RAW DATA"
@@ -19,4 +19,12 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_ROOT = os.path.join(PROJECT_ROOT, "data")
 CORPUS_ROOT = os.path.join(DATA_ROOT, "corpus")
 INDEX_ROOT = os.path.join(CORPUS_ROOT, "index")
-MANUALS_ROOT = os.path.join(DATA_ROOT, "manuals")
\ No newline at end of file
+MANUALS_ROOT = os.path.join(DATA_ROOT, "manuals")
+
+# Optional JSON-lines log of per-request search timings (see search_trace.py).
+# Disabled unless the AUTOASSIST_TRACE_LOG environment variable is set.
+TRACE_LOG_PATH = os.environ.get("AUTOASSIST_TRACE_LOG")
+
+# Optional append-only JSON-lines log of every search (see query_log.py),
+# used to replay real traffic. Disabled unless AUTOASSIST_QUERY_LOG is set.
+QUERY_LOG_PATH = os.environ.get("AUTOASSIST_QUERY_LOG")
@@ -0,0 +1,277 @@
+"""
+Filename: dense_index.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Optional dense (semantic) retrieval stage. Lexical TF-IDF misses
+    paraphrases such as "car shakes at highway speed" vs. "vibration above
+    100 km/h"; dense vectors place such passages close together.
+
+    Built offline over the passages of the published index generation:
+
+        - Passages are embedded in batches on the CPU, either with a latent
+          semantic model fitted on the TF-IDF matrix (model "lsa", needs
+          nothing beyond scikit-learn) or with any sentence-transformers
+          model if that package is installed.
+        - Vectors are L2-normalized and stored as a float16 .npy matrix that
+          is memory-mapped at query time.
+        - An IVF (inverted file) index groups the vectors under k-means
+          centroids; a query scores only the passages of the nprobe closest
+          centroids, which keeps lookups in the millisecond range.
+
+    Files go to data/corpus/index/dense/<generation>/, so a dense index is
+    always aligned with the TF-IDF rows it was built from. search() uses it
+    with retrieval="dense" (dense ranking only) or retrieval="hybrid"
+    (TF-IDF and dense scores fused).
+
+    Usage:
+        python src/dense_index.py                      (LSA, 256 dimensions)
+        python src/dense_index.py --model all-MiniLM-L6-v2
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import threading
+import numpy as np
+
+from config import INDEX_ROOT
+import index_store
+
+DENSE_DIR = "dense"
+DEFAULT_MODEL = "lsa"
+DEFAULT_DIM = 256
+DEFAULT_BATCH = 512
+DEFAULT_NPROBE = 8
+
+# Largest sample used to train the IVF centroids
+KMEANS_SAMPLE = 50000
+
+_dense_cache = {"key": None, "index": None, "encoders": {}}
+_dense_lock = threading.Lock()
+
+
+def dense_dir(generation, index_root=INDEX_ROOT):
+    return os.path.join(index_root, DENSE_DIR, generation or "legacy")
+
+
+def dense_available(generation=None, index_root=INDEX_ROOT):
+    if generation is None:
+        generation = index_store.current_generation(index_root)
+    return os.path.exists(os.path.join(dense_dir(generation, index_root), "dense.json"))
+
+
+# Encoders
+
+def _sentence_encoder(model_name):
+    """Load (once) a sentence-transformers model on the CPU."""
+    encoders = _dense_cache["encoders"]
+    if model_name not in encoders:
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise RuntimeError(
+                f"Dense model '{model_name}' needs the sentence-transformers package "
+                "(pip install sentence-transformers), or use --model lsa."
+            )
+        encoders[model_name] = SentenceTransformer(model_name, device="cpu")
+    return encoders[model_name]
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def embed_query(dense, query, query_vec):
+    """
+    Embed one query for `dense`. LSA projects the TF-IDF query vector
+    (already computed by search()); sentence models encode the text.
+    """
+    if dense["model"] == "lsa":
+        q = np.asarray(query_vec @ dense["components"].T, dtype=np.float32)
+    else:
+        q = _sentence_encoder(dense["model"]).encode([query], convert_to_numpy=True)
+    return _normalize(q)[0]
+
+
+# Offline build
+
+def _train_ivf(vectors, nlist, seed=0):
+    """k-means centroids over a sample of the (normalized) vectors."""
+    from sklearn.cluster import MiniBatchKMeans
+
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    sample = np.sort(rng.choice(n, size=min(n, KMEANS_SAMPLE), replace=False))
+    kmeans = MiniBatchKMeans(n_clusters=nlist, batch_size=4096, n_init=3, random_state=seed)
+    kmeans.fit(np.asarray(vectors[sample], dtype=np.float32))
+    return _normalize(kmeans.cluster_centers_)
+
+
+def build_dense_index(model=DEFAULT_MODEL, dim=DEFAULT_DIM, nlist=None,
+                      batch_size=DEFAULT_BATCH, index_root=INDEX_ROOT):
+    """Embed every passage of the current generation and write its dense index."""
+    from search_engine import current_index
+
+    start = time.perf_counter()
+    state = current_index()
+    tfidf_matrix, metadata = state["tfidf_matrix"], state["metadata"]
+    n = tfidf_matrix.shape[0]
+
+    out_dir = dense_dir(state["generation"], index_root)
+    tmp_dir = out_dir + f".build-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    components = None
+    if model == "lsa":
+        from sklearn.decomposition import TruncatedSVD
+
+        print(f"Fitting {dim}-dimensional LSA model...")
+        dim = min(dim, tfidf_matrix.shape[1] - 1)
+        svd = TruncatedSVD(n_components=dim, random_state=0)
+        svd.fit(tfidf_matrix)
+        components = svd.components_.astype(np.float32)
+        np.save(os.path.join(tmp_dir, "lsa_components.npy"), components)
+    else:
+        encoder = _sentence_encoder(model)
+        dim = encoder.get_sentence_embedding_dimension()
+
+    # Stream batches straight into the on-disk float16 matrix
+    vectors = np.lib.format.open_memmap(
+        os.path.join(tmp_dir, "vectors.npy"), mode="w+", dtype=np.float16, shape=(n, dim)
+    )
+    for lo in range(0, n, batch_size):
+        hi = min(n, lo + batch_size)
+        if components is not None:
+            batch = tfidf_matrix[lo:hi] @ components.T
+        else:
+            texts = [metadata[i]["text"] for i in range(lo, hi)]
+            batch = encoder.encode(texts, batch_size=64, convert_to_numpy=True)
+        vectors[lo:hi] = _normalize(batch).astype(np.float16)
+        print(f"\rEmbedded {hi}/{n} passages", end="", flush=True)
+    print()
+
+    if nlist is None:
+        nlist = int(np.clip(4 * np.sqrt(n), 1, 4096))
+    nlist = max(1, min(nlist, n))
+    print(f"Training IVF index with {nlist} lists...")
+    centroids = _train_ivf(vectors, nlist)
+
+    # Assign every passage to its closest centroid, in batches
+    assign = np.empty(n, dtype=np.int32)
+    for lo in range(0, n, batch_size * 8):
+        hi = min(n, lo + batch_size * 8)
+        sims = np.asarray(vectors[lo:hi], dtype=np.float32) @ centroids.T
+        assign[lo:hi] = sims.argmax(axis=1)
+
+    order = np.argsort(assign, kind="stable").astype(np.int32)
+    offsets = np.searchsorted(assign[order], np.arange(nlist + 1)).astype(np.int64)
+
+    np.save(os.path.join(tmp_dir, "ivf_centroids.npy"), centroids.astype(np.float32))
+    np.save(os.path.join(tmp_dir, "ivf_order.npy"), order)
+    np.save(os.path.join(tmp_dir, "ivf_offsets.npy"), offsets)
+    del vectors
+
+    info = {
+        "generation": state["generation"],
+        "model": model,
+        "dim": int(dim),
+        "nlist": int(nlist),
+        "passages": int(n),
+        "build_seconds": round(time.perf_counter() - start, 3),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(tmp_dir, "dense.json"), "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+
+    # Swap in the finished directory, then drop dense indexes of removed generations
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.rename(tmp_dir, out_dir)
+    live = set(index_store.list_generations(index_root)) | {"legacy"}
+    root = os.path.join(index_root, DENSE_DIR)
+    for name in os.listdir(root):
+        if name not in live and ".build-" not in name:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    print(f"Dense index saved -> {out_dir} ({info['build_seconds']} s)")
+    return info
+
+
+# Query time
+
+def load_dense(generation, index_root=INDEX_ROOT):
+    """Memory-map the dense index of a generation (cached). None if not built."""
+    key = (index_root, generation)
+    if _dense_cache["key"] == key:
+        return _dense_cache["index"]
+
+    with _dense_lock:
+        if _dense_cache["key"] == key:
+            return _dense_cache["index"]
+
+        path = dense_dir(generation, index_root)
+        dense = None
+        if os.path.exists(os.path.join(path, "dense.json")):
+            with open(os.path.join(path, "dense.json"), "r", encoding="utf-8") as f:
+                dense = json.load(f)
+            dense["vectors"] = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+            dense["centroids"] = np.load(os.path.join(path, "ivf_centroids.npy"))
+            dense["order"] = np.load(os.path.join(path, "ivf_order.npy"), mmap_mode="r")
+            dense["offsets"] = np.load(os.path.join(path, "ivf_offsets.npy"))
+            if dense["model"] == "lsa":
+                dense["components"] = np.load(os.path.join(path, "lsa_components.npy"))
+
+        _dense_cache["index"] = dense
+        _dense_cache["key"] = key
+        return dense
+
+
+def dense_candidates(dense, query, query_vec, k, nprobe=DEFAULT_NPROBE):
+    """
+    Approximate nearest passages for a query: scan the nprobe closest IVF
+    lists and return (passage_ids, cosine_similarities) of the best k.
+    """
+    q = embed_query(dense, query, query_vec)
+
+    centroid_sims = dense["centroids"] @ q
+    nprobe = min(nprobe, centroid_sims.size)
+    probe = np.argpartition(-centroid_sims, nprobe - 1)[:nprobe]
+
+    offsets, order = dense["offsets"], dense["order"]
+    ids = np.concatenate([order[offsets[l]:offsets[l + 1]] for l in probe])
+    if ids.size == 0:
+        return ids, np.empty(0, dtype=np.float32)
+
+    ids.sort()  # sequential reads from the memory-mapped matrix
+    sims = np.asarray(dense["vectors"][ids], dtype=np.float32) @ q
+
+    if ids.size > k:
+        best = np.argpartition(-sims, k - 1)[:k]
+        ids, sims = ids[best], sims[best]
+    return ids, sims
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the dense retrieval index.")
+    parser.add_argument("--model", default=DEFAULT_MODEL,
+                        help="'lsa' or a sentence-transformers model name")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM,
+                        help="Dimensions for the LSA model")
+    parser.add_argument("--nlist", type=int, default=None,
+                        help="Number of IVF lists (default: 4 * sqrt(passages))")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH)
+    args = parser.parse_args()
+
+    build_dense_index(args.model, args.dim, args.nlist, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
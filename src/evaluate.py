@@ -12,16 +12,31 @@ Description:
     4. Computes Precision@5, Recall@5, and F1@5
     5. Saves human judgments into human_judgments.json
 
+    With --batch the script runs non-interactively instead: the saved
+    judgments are replayed as qrels against TEST_QUERIES (plus any
+    --queries files), P@k, R@k, MRR and nDCG@k are computed together
+    with per-query latency percentiles, and everything is written to a
+    JSON report so ranking and indexing changes can be compared run
+    to run.
+
 Author: Kunal Sinha
 Course: CS410 - Text Information Systems (Fall 2025), UIUC
 """
 
 import json
-from search_engine import search, find_pdf_recursive
+import math
+import time
+import argparse
+import numpy as np
+from search_engine import search, find_pdf_recursive, detect_car_make, correct_query
 from query_normalizer import normalize_query
+from reranker import RERANK_CANDIDATES
 import subprocess
 import os
 
+# Judgments saved by the interactive mode (used as qrels by --batch)
+JUDGMENTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "human_judgments.json")
+
 # Queries used for evaluation (updated list)
 
 TEST_QUERIES = [
@@ -76,6 +91,39 @@ def f1_score(p, r):
         return 0.0
     return 2 * p * r / (p + r)
 
+def reciprocal_rank(retrieved, relevant):
+    """1 / rank of the first relevant result, 0 if none was retrieved."""
+    for rank, doc in enumerate(retrieved, start=1):
+        if doc in relevant:
+            return 1.0 / rank
+    return 0.0
+
+def ndcg_at_k(retrieved, relevant, k=5):
+    """Binary-gain nDCG@k against the judged relevant set."""
+    dcg = sum(
+        1.0 / math.log2(rank + 1)
+        for rank, doc in enumerate(retrieved[:k], start=1)
+        if doc in relevant
+    )
+    ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(len(relevant), k) + 1))
+    if ideal == 0:
+        return 0.0
+    return dcg / ideal
+
+def latency_summary(samples_ms):
+    """Percentiles (milliseconds) over a list of latency samples."""
+    if not samples_ms:
+        return {}
+    arr = np.asarray(samples_ms, dtype=float)
+    return {
+        "count": int(arr.size),
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": float(arr.max()),
+    }
+
 
 # Helper: Open PDF
 
@@ -89,7 +137,7 @@ def open_pdf_file(pdf_path):
 
 # Main evaluation loop\
 
-def main():
+def run_interactive():
     print("\nAutoAssist Manual Evaluation (Interactive Mode - P@5)")
     print("-----------------------------------------------------")
     print("For each query, top-5 results are shown AND opened.")
@@ -179,5 +227,231 @@ def main():
     print("\nSaved -> human_judgments.json\n")
 
 
+# Offline batch evaluation (qrels replay)
+
+def query_key(query):
+    """
+    Canonical form used to match queries against the judgments file.
+    The saved judgments use typographic dashes while TEST_QUERIES uses
+    plain hyphens, so both are folded together with case and spacing.
+    """
+    q = query.replace("\u2014", "-").replace("\u2013", "-")
+    return " ".join(q.lower().split())
+
+def page_key(doc_id):
+    """
+    Strip the running passage counter from a doc_id, leaving
+    make_pdf_pPAGE. The counter shifts whenever a manual is added and
+    the index is rebuilt, so page-level matching keeps old judgments
+    usable across rebuilds.
+    """
+    return doc_id.rsplit("_", 1)[0]
+
+def load_qrels(path):
+    """Load {query: [relevant doc_ids]} keyed by query_key()."""
+    with open(path, "r", encoding="utf-8") as f:
+        judgments = json.load(f)
+    return {query_key(q): list(doc_ids) for q, doc_ids in judgments.items()}
+
+def load_query_file(path):
+    """
+    Read extra evaluation queries. Accepts a JSON list of queries, a JSON
+    judgments dict ({query: [doc_ids]}, merged into the qrels), or a plain
+    text file with one query per line ('#' starts a comment).
+    Returns (queries, qrels).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    if path.lower().endswith(".json"):
+        data = json.loads(content)
+        if isinstance(data, dict):
+            qrels = {query_key(q): list(ids) for q, ids in data.items()}
+            return list(data.keys()), qrels
+        return [str(q) for q in data], {}
+
+    queries = [
+        line.strip() for line in content.splitlines()
+        if line.strip() and not line.strip().startswith("#")
+    ]
+    return queries, {}
+
+def evaluate_query(query, relevant, k=5, repeat=1, use_make=False, match="page",
+                   collapse=False, rerank=False, candidates=RERANK_CANDIDATES, spell=False):
+    """
+    Run one query through the search path (optional make detection on
+    the raw query, optional spelling correction, normalize, search) and
+    score it against its judged doc_ids. The CLI only suggests
+    corrections, so `spell` is off unless the corrector itself is being
+    evaluated. Returns a per-query result dict.
+    """
+    latencies = []
+    results = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        car_make = detect_car_make(query) if use_make else None
+        corrected = correct_query(query)[0] if spell else query
+        normalized = normalize_query(corrected)
+        results = search(normalized, top_k=k, car_make=car_make, collapse_pages=collapse,
+                         rerank=rerank, candidates=candidates)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+    retrieved = [r["doc_id"] for r in results]
+    entry = {
+        "query": query,
+        "normalized": normalized,
+        "car_make": car_make,
+        "retrieved": retrieved,
+        "latency_ms": latencies,
+        "judged": relevant is not None,
+    }
+
+    if relevant is None:
+        return entry
+
+    if match == "page":
+        # Passages of the same page count once, or P/R/nDCG can exceed 1
+        keyed = list(dict.fromkeys(page_key(d) for d in retrieved))
+        relevant_set = {page_key(d) for d in relevant}
+    else:
+        keyed = retrieved
+        relevant_set = set(relevant)
+
+    hits = sum(1 for d in keyed[:k] if d in relevant_set)
+    p = precision_at_k(hits, k)
+    r = recall_at_k(hits, len(relevant_set))
+
+    entry.update({
+        "num_relevant": len(relevant_set),
+        "hits": hits,
+        "precision": p,
+        "recall": r,
+        "f1": f1_score(p, r),
+        "reciprocal_rank": reciprocal_rank(keyed, relevant_set),
+        "ndcg": ndcg_at_k(keyed, relevant_set, k),
+    })
+    return entry
+
+def run_batch(qrels_path=JUDGMENTS_PATH, query_files=(), k=5, repeat=1,
+              use_make=False, match="page", out_path="eval_results.json", collapse=False,
+              rerank=False, candidates=RERANK_CANDIDATES, spell=False):
+    """Replay the judgments over every query and write a JSON report."""
+    qrels = load_qrels(qrels_path) if os.path.exists(qrels_path) else {}
+
+    queries = list(TEST_QUERIES)
+    for path in query_files:
+        extra_queries, extra_qrels = load_query_file(path)
+        queries.extend(extra_queries)
+        qrels.update(extra_qrels)
+
+    # Drop duplicates while keeping order
+    unique = {}
+    for q in queries:
+        unique.setdefault(query_key(q), q)
+    queries = list(unique.values())
+
+    print(f"\nAutoAssist Batch Evaluation (k={k}, {len(queries)} queries, match={match})")
+    print("-----------------------------------------------------")
+
+    # Warm-up so the first timed query is not charged for cold caches
+    search(normalize_query(queries[0]), top_k=k)
+
+    per_query = []
+    for query in queries:
+        entry = evaluate_query(query, qrels.get(query_key(query)), k, repeat, use_make, match,
+                               collapse, rerank, candidates, spell)
+        per_query.append(entry)
+
+        median_ms = float(np.median(entry["latency_ms"]))
+        if entry["judged"]:
+            print(f"P@{k}={entry['precision']:.3f}  R@{k}={entry['recall']:.3f}  "
+                  f"RR={entry['reciprocal_rank']:.3f}  nDCG={entry['ndcg']:.3f}  "
+                  f"{median_ms:7.1f} ms  {query}")
+        else:
+            print(f"(no judgments)  {median_ms:7.1f} ms  {query}")
+
+    judged = [e for e in per_query if e["judged"]]
+    n = len(judged)
+    summary = {
+        "num_queries": len(per_query),
+        "num_judged": n,
+        f"mean_precision@{k}": sum(e["precision"] for e in judged) / n if n else None,
+        f"mean_recall@{k}": sum(e["recall"] for e in judged) / n if n else None,
+        f"mean_f1@{k}": sum(e["f1"] for e in judged) / n if n else None,
+        "mrr": sum(e["reciprocal_rank"] for e in judged) / n if n else None,
+        f"mean_ndcg@{k}": sum(e["ndcg"] for e in judged) / n if n else None,
+        "latency_ms": latency_summary([ms for e in per_query for ms in e["latency_ms"]]),
+    }
+
+    report = {
+        "config": {
+            "k": k,
+            "repeat": repeat,
+            "match": match,
+            "detect_make": use_make,
+            "collapse_pages": collapse,
+            "rerank": rerank,
+            "candidates": candidates if rerank else None,
+            "spell": spell,
+            "qrels": qrels_path,
+            "query_files": list(query_files),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "summary": summary,
+        "queries": per_query,
+    }
+
+    print("\n=====================================")
+    print(f"   Macro-Averaged Evaluation (k={k})")
+    print("=====================================")
+    if n:
+        print(f"Mean Precision@{k}: {summary[f'mean_precision@{k}']:.3f}")
+        print(f"Mean Recall@{k}:    {summary[f'mean_recall@{k}']:.3f}")
+        print(f"MRR:               {summary['mrr']:.3f}")
+        print(f"Mean nDCG@{k}:      {summary[f'mean_ndcg@{k}']:.3f}")
+    lat = summary["latency_ms"]
+    print(f"Latency (ms):      p50={lat['p50']:.1f}  p95={lat['p95']:.1f}  p99={lat['p99']:.1f}")
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\nSaved -> {out_path}\n")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate AutoAssist retrieval quality.")
+    parser.add_argument("--batch", action="store_true",
+                        help="Replay saved judgments instead of asking for labels")
+    parser.add_argument("--qrels", default=JUDGMENTS_PATH,
+                        help="Judgments file used as qrels in batch mode")
+    parser.add_argument("--queries", action="append", default=[],
+                        help="Extra query file (.txt, one per line, or .json); repeatable")
+    parser.add_argument("--k", type=int, default=5, help="Rank cutoff")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Timed runs per query for latency percentiles")
+    parser.add_argument("--detect-make", action="store_true",
+                        help="Apply make detection/boosting like the CLI and UI do")
+    parser.add_argument("--match", choices=["page", "doc"], default="page",
+                        help="Match judgments by page (survives rebuilds) or exact doc_id")
+    parser.add_argument("--collapse", action="store_true",
+                        help="Return one result per manual page, like the CLI and UI")
+    parser.add_argument("--rerank", action="store_true",
+                        help="Re-rank first-stage candidates with reranker.py")
+    parser.add_argument("--candidates", type=int, default=RERANK_CANDIDATES,
+                        help="First-stage candidates passed to the re-ranker")
+    parser.add_argument("--spell", action="store_true",
+                        help="Apply spelling correction to each query before searching")
+    parser.add_argument("--out", default="eval_results.json", help="Batch report path")
+    args = parser.parse_args()
+
+    if args.batch:
+        run_batch(args.qrels, args.queries, args.k, max(1, args.repeat),
+                  args.detect_make, args.match, args.out, args.collapse,
+                  args.rerank, args.candidates, args.spell)
+    else:
+        run_interactive()
+
+
 if __name__ == "__main__":
     main()
@@ -2,18 +2,33 @@
 Filename: extract_pdfs.py
 Project: AutoAssist - Vehicle Maintenance Question Answering Tool
 Description:
-    PDF extraction utility using pdfplumber. Processes each page
-    into standalone text files for downstream passage segmentation.
+    PDF extraction utility. Processes each page into standalone text
+    files for downstream passage segmentation.
+
+    Extraction is tiered: every page is first read from the PDF's text
+    layer with PyPDF2, which is several times faster than layout
+    analysis. Only pages whose fast output looks broken (empty, garbled,
+    words run together, or table-heavy) are extracted again with
+    pdfplumber. The path each page took is recorded in an extraction log
+    next to the page files. Without PyPDF2 installed every page goes
+    through pdfplumber as before.
 
 Author: Kunal Sinha
 Course: CS410 - Text Information Systems (Fall 2025), UIUC
 """
 
 import os
+import re
+import json
 import pdfplumber
 from pathlib import Path
 from tqdm import tqdm
 
+try:
+    from PyPDF2 import PdfReader
+except ImportError:
+    PdfReader = None
+
 from config import PROJECT_ROOT, CORPUS_ROOT, MANUALS_ROOT
 ROOT = PROJECT_ROOT
 OUTPUT_ROOT = CORPUS_ROOT
@@ -24,17 +39,134 @@ MANUFACTURERS = {
     "honda": "2005_to_2011_Honda_Civic_Workshop_Manual.pdf"
 }
 
+# Fast-path output is rejected when it fails any of these checks
+MIN_PAGE_CHARS = 20          # fewer visible characters: empty/scanned page
+MIN_CLEAN_RATIO = 0.90       # share of ordinary text characters
+MAX_AVG_WORD_LEN = 15        # longer average "words": spaces were lost
+MAX_NUMERIC_LINE_RATIO = 0.5 # share of lines that are mostly numbers: a table
+
+_CLEAN_CHARS = re.compile(r"[\w\s.,;:!?()\[\]/\\'\"%&+\-=*#<>°~@$]")
+_GLYPH_CODES = re.compile(r"\(cid:\d+\)")
+_NUMBER = re.compile(r"^[\d.,:/%±+\-–]+$")
+
+
+def fast_text_problem(text):
+    """
+    Why fast-path text for a page should not be trusted, or None if it
+    looks fine: "empty", "garbled", "no_spaces" or "table".
+    """
+    visible = "".join(text.split())
+    if len(visible) < MIN_PAGE_CHARS:
+        return "empty"
+
+    clean = len(_CLEAN_CHARS.findall(text))
+    if clean / len(text) < MIN_CLEAN_RATIO or _GLYPH_CODES.search(text) or "\ufffd" in text:
+        return "garbled"
+
+    words = text.split()
+    if len(visible) / len(words) > MAX_AVG_WORD_LEN:
+        return "no_spaces"
+
+    lines = [line.split() for line in text.splitlines() if line.strip()]
+    numeric = sum(
+        1 for tokens in lines
+        if sum(1 for t in tokens if _NUMBER.match(t)) * 2 >= len(tokens)
+    )
+    if len(lines) >= 5 and numeric / len(lines) > MAX_NUMERIC_LINE_RATIO:
+        return "table"
+    return None
+
+
+def iter_pdf_pages(pdf_path, log=None, fast=True):
+    """
+    Yield (page_number, text) for each page of a PDF, one page at a time.
+
+    Pages come from PyPDF2 when its text passes fast_text_problem(), and
+    from pdfplumber otherwise; pdfplumber is only opened once a page needs
+    it. Each pdfplumber page's layout objects are released before the next
+    page, so memory stays flat however long the manual is. When `log` is
+    a list, one {"page", "method", "reason"} entry per page is appended.
+    A PDF that PyPDF2 cannot open or count pages of (damaged or encrypted
+    files) goes through pdfplumber as a whole.
+    """
+    reader = None
+    fallback = "no_fast_extractor"
+    if fast and PdfReader is not None:
+        try:
+            reader = PdfReader(pdf_path)
+            page_count = len(reader.pages)
+        except Exception:
+            reader = None
+            fallback = "fast_open_error"
+
+    plumber = None
+    try:
+        if reader is None:
+            plumber = pdfplumber.open(pdf_path)
+            page_count = len(plumber.pages)
+
+        for i in range(1, page_count + 1):
+            reason = fallback
+            if reader is not None:
+                try:
+                    text = reader.pages[i - 1].extract_text() or ""
+                    reason = fast_text_problem(text)
+                except Exception:
+                    reason = "fast_error"
+                if reason is None:
+                    if log is not None:
+                        log.append({"page": i, "method": "pypdf2", "reason": None})
+                    yield i, text
+                    continue
+
+            if plumber is None:
+                plumber = pdfplumber.open(pdf_path)
+            page = plumber.pages[i - 1]
+            text = page.extract_text() or ""
+            page.close()
+            if log is not None:
+                log.append({"page": i, "method": "pdfplumber", "reason": reason})
+            yield i, text
+    finally:
+        if plumber is not None:
+            plumber.close()
+
+
+def summarize_extraction(log):
+    """Pages per extraction method and fallback reason."""
+    summary = {"pages": len(log), "methods": {}, "fallback_reasons": {}}
+    for entry in log:
+        summary["methods"][entry["method"]] = summary["methods"].get(entry["method"], 0) + 1
+        if entry["method"] == "pdfplumber":
+            reasons = summary["fallback_reasons"]
+            reasons[entry["reason"]] = reasons.get(entry["reason"], 0) + 1
+    return summary
+
+
+def write_extraction_log(pdf_path, log, out_path):
+    """Save the per-page extraction log of one PDF as JSON."""
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "source_pdf": os.path.basename(pdf_path),
+            "summary": summarize_extraction(log),
+            "pages": log,
+        }, f, indent=1)
+
+
 def process_pdf_with_pages(pdf_path, out_dir):
     """Extract text from each page and save as separate files with metadata."""
+    log = []
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for i, page in enumerate(pdf.pages, start=1):
-                text = page.extract_text() or ""
-                outname = f"{Path(pdf_path).stem}_page{i}.txt"
-                with open(os.path.join(out_dir, outname), "w", encoding="utf-8") as f:
-                    f.write(text)
+        for i, text in iter_pdf_pages(pdf_path, log):
+            outname = f"{Path(pdf_path).stem}_page{i}.txt"
+            with open(os.path.join(out_dir, outname), "w", encoding="utf-8") as f:
+                f.write(text)
     except Exception as e:
         print(f"Error processing {pdf_path}: {e}")
+    if log:
+        write_extraction_log(
+            pdf_path, log, os.path.join(out_dir, f"{Path(pdf_path).stem}_extraction.json")
+        )
 
 def process_manufacturer(name, rel_path):
     manu_raw_dir = os.path.join(OUTPUT_ROOT, name, "raw_text")
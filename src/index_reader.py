@@ -0,0 +1,429 @@
+"""
+Filename: index_reader.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Query-side reader for the TF-IDF index. Searching only needs numpy,
+    scipy.sparse and this module; the ingestion stack (scikit-learn,
+    pdfplumber, nltk, tqdm) is never imported to answer a query.
+
+    At build time tfidf_indexer exports what the fitted TfidfVectorizer
+    needs to turn a query into a vector:
+
+        - query_vectorizer.json  (tokenizer settings and stop words)
+        - vocabulary.txt         (one term per line, in column order)
+        - idf.npy                (idf weight per column)
+
+    QueryVectorizer rebuilds sklearn's word analyzer (lowercase, token
+    regex, stop words, word n-grams) and weighting (raw counts x idf, L2
+    norm) from those files, producing the same vectors as the pickled
+    vectorizer without unpickling it. Indexes built before the export
+    existed fall back to vectorizer.pkl, which does import scikit-learn.
+
+    scipy.sparse is imported on first use rather than at module import,
+    so the CLI prompt appears before that cost is paid.
+
+    The passage matrix can be stored compactly (see compact_matrix):
+    float32 weights, or 8/16-bit codes with one float32 scale per row,
+    and the narrowest integer type for the column indices and row
+    pointers. Readers always get a float32 or float64 CSR matrix back.
+
+    read_index(mmap=True) memory-maps the matrix and the per-passage
+    arrays only. The passage metadata (text, make, model, page, ...) is
+    unpickled into a list of dicts, which is the largest Python-object
+    part of a loaded index (about 5.7 MB for 4,531 passages). Pre-fork
+    server workers share it copy-on-write after gc.freeze(), but every
+    result and rerank candidate touches refcounts of its dict, so the
+    pages a worker reads are gradually copied into that worker.
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import os
+import re
+import json
+import pickle
+import numpy as np
+
+from page_classifier import PAGE_WEIGHTS
+
+VECTORIZER_FILE = "query_vectorizer.json"
+VOCABULARY_FILE = "vocabulary.txt"
+IDF_FILE = "idf.npy"
+SCALE_FILE = "tfidf_scale.npy"
+
+# Storage types for the passage matrix weights (uint* are quantized per row)
+MATRIX_DTYPES = ("float64", "float32", "uint16", "uint8")
+
+
+class QueryVectorizer:
+    """Transform-only stand-in for a fitted word-level TfidfVectorizer."""
+
+    def __init__(self, vocabulary, idf, stop_words=(), ngram_range=(1, 1),
+                 lowercase=True, token_pattern=r"(?u)\b\w\w+\b", norm="l2",
+                 sublinear_tf=False):
+        self.vocabulary_ = vocabulary
+        self.idf_ = idf
+        self.stop_words = frozenset(stop_words)
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.token_pattern = re.compile(token_pattern)
+        self.norm = norm
+        self.sublinear_tf = sublinear_tf
+
+    def get_stop_words(self):
+        return self.stop_words
+
+    def analyze(self, text):
+        """Terms of `text` exactly as TfidfVectorizer's word analyzer emits them."""
+        if self.lowercase:
+            text = text.lower()
+        tokens = [t for t in self.token_pattern.findall(text) if t not in self.stop_words]
+
+        low, high = self.ngram_range
+        if high == 1:
+            return tokens
+        terms = list(tokens) if low == 1 else []
+        for n in range(max(low, 2), high + 1):
+            terms.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def transform(self, texts):
+        """Sparse TF-IDF rows for `texts` (one row per text)."""
+        from scipy.sparse import csr_matrix
+
+        indptr = [0]
+        indices = []
+        values = []
+        for text in texts:
+            counts = {}
+            for term in self.analyze(text):
+                col = self.vocabulary_.get(term)
+                if col is not None:
+                    counts[col] = counts.get(col, 0) + 1
+
+            cols = np.fromiter(sorted(counts), dtype=np.int32, count=len(counts))
+            tf = np.array([counts[c] for c in cols], dtype=np.float64)
+            if self.sublinear_tf:
+                tf = np.log(tf) + 1
+            weights = tf * self.idf_[cols]
+            if self.norm == "l2" and weights.size:
+                weights /= np.sqrt(np.dot(weights, weights))
+            elif self.norm == "l1" and weights.size:
+                weights /= np.abs(weights).sum()
+
+            indices.append(cols)
+            values.append(weights)
+            indptr.append(indptr[-1] + cols.size)
+
+        return csr_matrix(
+            (np.concatenate(values) if values else np.empty(0),
+             np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+             np.array(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, len(self.idf_)),
+        )
+
+    @classmethod
+    def load(cls, index_dir):
+        with open(os.path.join(index_dir, VECTORIZER_FILE), "r", encoding="utf-8") as f:
+            config = json.load(f)
+        with open(os.path.join(index_dir, VOCABULARY_FILE), "r", encoding="utf-8") as f:
+            terms = f.read().split("\n")
+        vocabulary = dict(zip(terms, range(config["vocabulary_size"])))
+        idf = np.load(os.path.join(index_dir, IDF_FILE))
+        return cls(
+            vocabulary, idf, config["stop_words"], config["ngram_range"],
+            config["lowercase"], config["token_pattern"], config["norm"],
+            config["sublinear_tf"],
+        )
+
+
+def export_vectorizer(vectorizer, out_dir):
+    """
+    Write the query-time parts of a fitted TfidfVectorizer next to the
+    index. Returns False (writing nothing) for settings QueryVectorizer
+    does not reproduce, in which case readers use vectorizer.pkl.
+    """
+    params = vectorizer.get_params()
+    if (params["analyzer"] != "word" or params["tokenizer"] is not None
+            or params["preprocessor"] is not None or params["strip_accents"] is not None
+            or not params["use_idf"]):
+        return False
+
+    terms = [None] * len(vectorizer.vocabulary_)
+    for term, col in vectorizer.vocabulary_.items():
+        terms[col] = term
+    if any("\n" in t for t in terms):
+        return False
+
+    config = {
+        "vocabulary_size": len(terms),
+        "stop_words": sorted(vectorizer.get_stop_words() or ()),
+        "ngram_range": list(params["ngram_range"]),
+        "lowercase": params["lowercase"],
+        "token_pattern": params["token_pattern"],
+        "norm": params["norm"],
+        "sublinear_tf": params["sublinear_tf"],
+    }
+    with open(os.path.join(out_dir, VECTORIZER_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    with open(os.path.join(out_dir, VOCABULARY_FILE), "w", encoding="utf-8") as f:
+        f.write("\n".join(terms))
+    np.save(os.path.join(out_dir, IDF_FILE), vectorizer.idf_)
+    return True
+
+
+def load_vectorizer(index_dir):
+    """QueryVectorizer if exported, otherwise the pickled TfidfVectorizer."""
+    if os.path.exists(os.path.join(index_dir, VECTORIZER_FILE)):
+        return QueryVectorizer.load(index_dir)
+    with open(os.path.join(index_dir, "vectorizer.pkl"), "rb") as f:
+        return pickle.load(f)
+
+
+def _narrow_int(values, limit):
+    """`values` in the smallest of uint16/int32/int64 that holds `limit`."""
+    for dtype in (np.uint16, np.int32):
+        if limit <= np.iinfo(dtype).max:
+            return values.astype(dtype, copy=False)
+    return values.astype(np.int64, copy=False)
+
+
+def compact_matrix(matrix, dtype="float32"):
+    """
+    Storage arrays (data, indices, indptr, scale) for a CSR matrix.
+
+    float32/float64 keep the weights as floats and scale is None. uint16
+    and uint8 store each weight as a code relative to the largest weight
+    of its row, with that row maximum kept in `scale`, so every row uses
+    the full code range. Non-zero weights never round to code 0, which
+    keeps the sparsity pattern (and candidate sets) unchanged.
+    """
+    if dtype not in MATRIX_DTYPES:
+        raise ValueError(f"dtype must be one of {', '.join(MATRIX_DTYPES)}")
+    matrix = matrix.tocsr()
+    indices = _narrow_int(matrix.indices, matrix.shape[1] - 1)
+    # Row pointers stay at least int32, which scipy.sparse uses anyway
+    indptr = matrix.indptr.astype(np.int32 if matrix.nnz <= np.iinfo(np.int32).max
+                                  else np.int64, copy=False)
+
+    if dtype in ("float64", "float32"):
+        return matrix.data.astype(dtype, copy=False), indices, indptr, None
+
+    levels = np.iinfo(dtype).max
+    lengths = np.diff(matrix.indptr)
+    scale = np.zeros(matrix.shape[0], dtype=np.float32)
+    filled = lengths > 0
+    scale[filled] = np.maximum.reduceat(np.abs(matrix.data), matrix.indptr[:-1][filled])
+    row_scale = np.repeat(scale, lengths).astype(np.float64)
+    codes = np.rint(matrix.data / np.where(row_scale > 0, row_scale, 1.0) * levels)
+    data = np.clip(codes, 1, levels).astype(dtype)
+    return data, indices, indptr, scale / levels
+
+
+def expand_matrix(data, indices, indptr, scale, shape):
+    """CSR matrix from compact_matrix() arrays (float32 when quantized)."""
+    from scipy.sparse import csr_matrix
+
+    # scipy.sparse needs int32/int64 index arrays
+    if indices.dtype == np.uint16:
+        indices = indices.astype(np.int32)
+    if scale is not None:
+        data = data.astype(np.float32) * np.repeat(scale, np.diff(indptr))
+    return csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+
+def build_page_ids(metadata):
+    """
+    Integer id per distinct (make, source_pdf, page_number), one entry
+    per passage, so grouping hits by page is an array operation.
+    """
+    ids = {}
+    page_ids = np.empty(len(metadata), dtype=np.int32)
+    for i, meta in enumerate(metadata):
+        page = (meta.get("make"), meta.get("source_pdf"), meta.get("page_number"))
+        page_ids[i] = ids.setdefault(page, len(ids))
+    return page_ids
+
+
+def build_make_codes(metadata):
+    """
+    Integer-code the (lowercased) make of every passage so make boosting
+    is a vectorized mask instead of a loop over the metadata dicts.
+    Returns (make_codes, make_labels).
+    """
+    labels = sorted({meta.get("make", "unknown").lower() for meta in metadata})
+    index = {label: code for code, label in enumerate(labels)}
+    codes = np.fromiter(
+        (index[meta.get("make", "unknown").lower()] for meta in metadata),
+        dtype=np.int16, count=len(metadata),
+    )
+    return codes, np.array(labels)
+
+
+def build_source_codes(metadata):
+    """
+    Integer-code the source PDF of every passage, so all passages of one
+    manual are found with an array comparison. Returns (source_codes,
+    source_labels).
+    """
+    labels = sorted({meta.get("source_pdf", "unknown") for meta in metadata})
+    index = {label: code for code, label in enumerate(labels)}
+    codes = np.fromiter(
+        (index[meta.get("source_pdf", "unknown")] for meta in metadata),
+        dtype=np.int32, count=len(metadata),
+    )
+    return codes, np.array(labels)
+
+
+def build_model_codes(metadata):
+    """
+    Integer-code the (lowercased) model of every passage, for facet
+    counts. Returns (model_codes, model_labels).
+    """
+    labels = sorted({str(meta.get("model", "unknown")).lower() for meta in metadata})
+    index = {label: code for code, label in enumerate(labels)}
+    codes = np.fromiter(
+        (index[str(meta.get("model", "unknown")).lower()] for meta in metadata),
+        dtype=np.int32, count=len(metadata),
+    )
+    return codes, np.array(labels)
+
+
+def build_passage_weights(metadata):
+    """Score multiplier per passage from the page type it came from."""
+    return np.fromiter(
+        (PAGE_WEIGHTS.get(meta.get("page_type", "prose"), 1.0) for meta in metadata),
+        dtype=np.float32, count=len(metadata),
+    )
+
+
+def build_doc_lengths(metadata):
+    """Token count of every passage (BM25 length normalization)."""
+    token_re = re.compile(r"\b\w\w+\b")
+    return np.fromiter(
+        (len(token_re.findall(meta["text"])) for meta in metadata),
+        dtype=np.int32, count=len(metadata),
+    )
+
+
+def _manual_codes(index_dir):
+    """(make_codes, make_labels, source_codes, source_labels) of an index."""
+    def npy(name):
+        path = os.path.join(index_dir, name)
+        return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+    arrays = [npy(name) for name in (
+        "make_codes.npy", "make_labels.npy", "source_codes.npy", "source_labels.npy")]
+    if any(a is None for a in arrays):
+        state = read_index(index_dir)
+        return (state["make_codes"], state["facet_labels"]["make"],
+                state["source_codes"], state["facet_labels"]["source_pdf"])
+    make_codes, make_labels, source_codes, source_labels = arrays
+    return (make_codes, [str(l) for l in make_labels],
+            source_codes, [str(l) for l in source_labels])
+
+
+def manual_rows(index_dir, make, source_pdf):
+    """
+    Rows of the passages of one manual (make + source PDF name, any case)
+    in an index, and the index's total row count. Only the small
+    per-passage code arrays are read, not the matrix or the metadata.
+    """
+    make_codes, make_labels, source_codes, source_labels = _manual_codes(index_dir)
+
+    make_code = {label: code for code, label in enumerate(make_labels)}.get(make.lower())
+    wanted = [code for code, label in enumerate(source_labels)
+              if label.lower() == source_pdf.lower()]
+    if make_code is None or not wanted:
+        return np.empty(0, dtype=np.intp), len(make_codes)
+    rows = np.flatnonzero((make_codes == make_code) & np.isin(source_codes, wanted))
+    return rows, len(make_codes)
+
+
+def row_manuals(index_dir, rows):
+    """The distinct manuals, as (make, source_pdf), that `rows` of an index belong to."""
+    make_codes, make_labels, source_codes, source_labels = _manual_codes(index_dir)
+    pairs = set(zip(np.asarray(make_codes)[rows].tolist(), np.asarray(source_codes)[rows].tolist()))
+    return {(make_labels[m], source_labels[s]) for m, s in pairs}
+
+
+def read_index(index_dir, generation=None, mmap=False):
+    """
+    Read every index artifact of `index_dir` into a state dict. With
+    mmap=True the .npy arrays are memory-mapped read-only, so forked
+    workers share the same physical pages instead of each holding a
+    private copy. Quantized weights and uint16 indices are expanded in
+    memory on load, so they are not shared that way.
+    """
+    mmap_mode = "r" if mmap else None
+
+    def npy(name):
+        path = os.path.join(index_dir, name)
+        return np.load(path, mmap_mode=mmap_mode) if os.path.exists(path) else None
+
+    vectorizer = load_vectorizer(index_dir)
+
+    data = npy("tfidf_data.npy")
+    if data is not None:
+        indptr = npy("tfidf_indptr.npy")
+        tfidf_matrix = expand_matrix(
+            data, npy("tfidf_indices.npy"), indptr, npy(SCALE_FILE),
+            shape=(indptr.shape[0] - 1, len(vectorizer.idf_)),
+        )
+    else:
+        # Index built before the matrix was stored as .npy arrays
+        with open(os.path.join(index_dir, "tfidf_matrix.pkl"), "rb") as f:
+            tfidf_matrix = pickle.load(f)
+
+    with open(os.path.join(index_dir, "metadata.pkl"), "rb") as f:
+        metadata = pickle.load(f)
+
+    page_ids = npy("page_ids.npy")
+    make_codes = npy("make_codes.npy")
+    make_labels = npy("make_labels.npy")
+    if page_ids is None or make_codes is None or make_labels is None:
+        # Index built before the per-passage arrays were stored
+        page_ids = build_page_ids(metadata)
+        make_codes, make_labels = build_make_codes(metadata)
+
+    source_codes = npy("source_codes.npy")
+    source_labels = npy("source_labels.npy")
+    if source_codes is None or source_labels is None:
+        source_codes, source_labels = build_source_codes(metadata)
+
+    model_codes = npy("model_codes.npy")
+    model_labels = npy("model_labels.npy")
+    if model_codes is None or model_labels is None:
+        model_codes, model_labels = build_model_codes(metadata)
+
+    passage_weights = npy("passage_weights.npy")
+    if passage_weights is None:
+        passage_weights = build_passage_weights(metadata)
+
+    # Missing in older indexes; the reranker then measures it on first use
+    doc_lengths = npy("doc_lengths.npy")
+    avg_doc_len = float(doc_lengths.mean()) if doc_lengths is not None and doc_lengths.size else None
+
+    return {
+        "generation": generation,
+        "vectorizer": vectorizer,
+        "tfidf_matrix": tfidf_matrix,
+        "metadata": metadata,
+        "page_ids": page_ids,
+        "make_codes": make_codes,
+        "passage_weights": passage_weights,
+        "weighted": bool((passage_weights != 1.0).any()),
+        "make_index": {str(label): code for code, label in enumerate(make_labels)},
+        "source_codes": source_codes,
+        "source_index": {str(label): code for code, label in enumerate(source_labels)},
+        # Integer-coded metadata fields and their labels, for facet counts
+        "facet_codes": {"make": make_codes, "model": model_codes, "source_pdf": source_codes},
+        "facet_labels": {"make": [str(l) for l in make_labels],
+                         "model": [str(l) for l in model_labels],
+                         "source_pdf": [str(l) for l in source_labels]},
+        "model_makes": {m["model"].lower(): m["make"].lower() for m in metadata},
+        "doc_freq": None,
+        "avg_doc_len": avg_doc_len,
+        "tombstones": (None, None),
+    }
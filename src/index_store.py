@@ -0,0 +1,361 @@
+"""
+Filename: index_store.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Atomic, versioned storage for the TF-IDF index.
+
+    Every build writes a complete new generation directory:
+
+        data/corpus/index/
+            CURRENT                      (name of the published generation)
+            generations/
+                20251019-143012-081532-4711/  (one directory per build)
+                    manifest.json
+                    vectorizer.pkl, metadata.pkl, tfidf_*.npy, ...
+
+    A build fills a hidden temporary directory, writes its manifest
+    (file checksums and sizes, passage count, vocabulary size, build
+    time), renames it into generations/ and only then publishes it by
+    atomically replacing CURRENT. Readers therefore always see one
+    complete build, never a new vectorizer next to an old matrix, and
+    concurrent rebuilds simply race to publish whole generations.
+
+    Readers detect a new generation by stat-ing CURRENT only, and reload
+    lazily when that changes. Old generations are garbage-collected,
+    keeping the newest few so processes still reading one are not cut
+    off mid-request.
+
+    Indexes from before generations existed (files directly under
+    data/corpus/index/) are still readable.
+
+    Generations are never modified after publishing. Passages removed
+    since a build (see manual_tools.remove_manual) are recorded in a
+    tombstone bitmap next to them, data/corpus/index/tombstones/
+    <generation>.npy, which search masks out until the next build or
+    compaction drops the rows for good. Manuals removed while a build is
+    running are tombstoned in the new generation too (see
+    tfidf_indexer.carry_tombstones).
+
+    Usage:
+        python src/index_store.py list
+        python src/index_store.py verify [generation]
+        python src/index_store.py gc
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+
+from config import INDEX_ROOT
+
+CURRENT_FILE = "CURRENT"
+GENERATIONS_DIR = "generations"
+MANIFEST_FILE = "manifest.json"
+TOMBSTONES_DIR = "tombstones"
+
+# Per-generation data built next to the index (index_root/<dir>/<generation>)
+DERIVED_DIRS = ("dense", "related")
+
+# Published generations kept on disk (the current one included)
+KEEP_GENERATIONS = 3
+
+# Unpublished build directories older than this are treated as abandoned
+STALE_BUILD_SECONDS = 24 * 3600
+
+# Files of an index from before generations existed
+LEGACY_FILES = (
+    "vectorizer.pkl", "metadata.pkl", "tfidf_matrix.pkl",
+    "tfidf_data.npy", "tfidf_indices.npy", "tfidf_indptr.npy",
+    "page_ids.npy", "make_codes.npy", "make_labels.npy",
+)
+
+
+def _generations_root(index_root):
+    return os.path.join(index_root, GENERATIONS_DIR)
+
+
+def new_build_dir(index_root=INDEX_ROOT):
+    """Create an empty, unpublished directory for a new build."""
+    now = time.time()
+    micros = int(now * 1e6) % 1000000
+    name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{micros:06d}-{os.getpid()}"
+    root = _generations_root(index_root)
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f".build-{name}")
+    os.makedirs(path)
+    return path
+
+
+def _sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, text):
+    """Write a small file so readers see either the old or the new content."""
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def publish(build_dir, info=None, index_root=INDEX_ROOT, keep=KEEP_GENERATIONS):
+    """
+    Seal a finished build: write its manifest, move it into place and
+    atomically point CURRENT at it. `info` holds extra manifest fields
+    (passages, vocabulary, build_seconds, ...). Returns the generation name.
+    """
+    files = {}
+    for name in sorted(os.listdir(build_dir)):
+        path = os.path.join(build_dir, name)
+        if os.path.isfile(path):
+            files[name] = {"bytes": os.path.getsize(path), "sha256": _sha256(path)}
+
+    generation = os.path.basename(build_dir).replace(".build-", "", 1)
+    manifest = {
+        "generation": generation,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": files,
+    }
+    manifest.update(info or {})
+    _write_atomic(os.path.join(build_dir, MANIFEST_FILE), json.dumps(manifest, indent=2))
+
+    final_dir = os.path.join(_generations_root(index_root), generation)
+    os.rename(build_dir, final_dir)
+    _write_atomic(os.path.join(index_root, CURRENT_FILE), generation + "\n")
+
+    collect_garbage(index_root, keep)
+    return generation
+
+
+def current_generation(index_root=INDEX_ROOT):
+    """Name of the published generation, or None for a legacy/missing index."""
+    try:
+        with open(os.path.join(index_root, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def generation_dir(generation, index_root=INDEX_ROOT):
+    return os.path.join(_generations_root(index_root), generation)
+
+
+def current_index_dir(index_root=INDEX_ROOT):
+    """
+    Directory holding the files of the index readers should use:
+    (generation, path). Legacy flat indexes report generation None.
+    """
+    generation = current_generation(index_root)
+    if generation is None:
+        return None, index_root
+    return generation, generation_dir(generation, index_root)
+
+
+def generation_stamp(index_root=INDEX_ROOT):
+    """
+    Cheap, stat-only fingerprint of what is currently published. Changes
+    whenever CURRENT is replaced. For legacy indexes it falls back to the
+    stat info of the flat index files.
+    """
+    try:
+        st = os.stat(os.path.join(index_root, CURRENT_FILE))
+        return (index_root, st.st_ino, st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        pass
+
+    key = [index_root]
+    for name in LEGACY_FILES:
+        path = os.path.join(index_root, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        key.append((name, st.st_mtime_ns, st.st_size))
+    return tuple(key)
+
+
+def read_manifest(generation, index_root=INDEX_ROOT):
+    with open(os.path.join(generation_dir(generation, index_root), MANIFEST_FILE),
+              "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_generations(index_root=INDEX_ROOT):
+    """Published generation names, oldest first."""
+    root = _generations_root(index_root)
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if not name.startswith(".") and os.path.isdir(os.path.join(root, name))
+    )
+
+
+def verify_generation(generation, index_root=INDEX_ROOT):
+    """Re-hash every file of a generation. Returns a list of problems (empty if OK)."""
+    manifest = read_manifest(generation, index_root)
+    gen_dir = generation_dir(generation, index_root)
+    problems = []
+    for name, expected in manifest["files"].items():
+        path = os.path.join(gen_dir, name)
+        if not os.path.exists(path):
+            problems.append(f"{name}: missing")
+        elif os.path.getsize(path) != expected["bytes"]:
+            problems.append(f"{name}: size {os.path.getsize(path)} != {expected['bytes']}")
+        elif _sha256(path) != expected["sha256"]:
+            problems.append(f"{name}: checksum mismatch")
+    return problems
+
+
+def tombstone_path(generation, index_root=INDEX_ROOT):
+    return os.path.join(index_root, TOMBSTONES_DIR, f"{generation or 'legacy'}.npy")
+
+
+def tombstone_stamp(generation, index_root=INDEX_ROOT):
+    """Stat-only fingerprint of a generation's tombstones (None if there are none)."""
+    try:
+        st = os.stat(tombstone_path(generation, index_root))
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def read_tombstones(generation, n_rows, index_root=INDEX_ROOT):
+    """Boolean mask of deleted rows of a generation, or None if nothing is deleted."""
+    try:
+        bits = np.load(tombstone_path(generation, index_root))
+    except FileNotFoundError:
+        return None
+    return np.unpackbits(bits, count=n_rows).astype(bool)
+
+
+def tombstone_snapshot(index_root=INDEX_ROOT):
+    """
+    (generation, index_dir, packed deleted bits or None) of the current
+    index. Taken when a build starts, to tell which removals happened
+    while it ran.
+    """
+    generation, index_dir = current_index_dir(index_root)
+    try:
+        bits = np.load(tombstone_path(generation, index_root))
+    except FileNotFoundError:
+        bits = None
+    return generation, index_dir, bits
+
+
+def add_tombstones(generation, rows, n_rows, index_root=INDEX_ROOT):
+    """
+    Mark `rows` of a generation as deleted. The bitmap is rewritten
+    atomically (it is n_rows / 8 bytes). Returns how many rows were not
+    deleted before.
+    """
+    deleted = read_tombstones(generation, n_rows, index_root)
+    if deleted is None:
+        deleted = np.zeros(n_rows, dtype=bool)
+    before = int(deleted.sum())
+    deleted[rows] = True
+
+    path = tombstone_path(generation, index_root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}.npy"
+    np.save(tmp, np.packbits(deleted))
+    os.replace(tmp, path)
+    return int(deleted.sum()) - before
+
+
+def collect_garbage(index_root=INDEX_ROOT, keep=KEEP_GENERATIONS):
+    """
+    Delete all but the newest `keep` published generations (never the
+    current one), their tombstones and derived directories (DERIVED_DIRS),
+    and abandoned build directories. Files still open or
+    memory-mapped by a running process stay readable on POSIX systems;
+    where deletion fails (e.g. Windows) the generation is left for the
+    next collection.
+    """
+    root = _generations_root(index_root)
+    if not os.path.isdir(root):
+        return []
+
+    current = current_generation(index_root)
+    published = list_generations(index_root)
+    doomed = [g for g in published[:-keep] if g != current] if keep > 0 else []
+
+    now = time.time()
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith(".build-") and now - os.path.getmtime(path) > STALE_BUILD_SECONDS:
+            doomed.append(name)
+
+    removed = []
+    for name in doomed:
+        try:
+            shutil.rmtree(os.path.join(root, name))
+            removed.append(name)
+        except OSError:
+            continue
+        try:
+            os.remove(tombstone_path(name, index_root))
+        except OSError:
+            pass
+
+    # Derived data of generations that no longer exist, including any left
+    # behind by earlier collections
+    live = set(list_generations(index_root)) | {"legacy"}
+    for derived in DERIVED_DIRS:
+        derived_root = os.path.join(index_root, derived)
+        if not os.path.isdir(derived_root):
+            continue
+        for name in os.listdir(derived_root):
+            path = os.path.join(derived_root, name)
+            if ".build-" in name:
+                if now - os.path.getmtime(path) <= STALE_BUILD_SECONDS:
+                    continue
+            elif name in live:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+    return removed
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    current = current_generation()
+
+    if command == "list":
+        for generation in list_generations():
+            m = read_manifest(generation)
+            marker = "*" if generation == current else " "
+            print(f"{marker} {generation}  passages={m.get('passages')}  "
+                  f"vocabulary={m.get('vocabulary')}  build={m.get('build_seconds')}s")
+        if current is None:
+            print("No published generation (legacy or missing index).")
+    elif command == "verify":
+        generation = sys.argv[2] if len(sys.argv) > 2 else current
+        if generation is None:
+            sys.exit("No published generation to verify.")
+        problems = verify_generation(generation)
+        for p in problems:
+            print(p)
+        print(f"{generation}: {'OK' if not problems else 'CORRUPT'}")
+        sys.exit(1 if problems else 0)
+    elif command == "gc":
+        for name in collect_garbage():
+            print(f"Removed {name}")
+    else:
+        sys.exit(f"Unknown command: {command} (use list, verify or gc)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,38 @@ Project: AutoAssist - Vehicle Maintenance Question Answering Tool
 Description:
     Utility module for adding new car manuals to the system.
     Handles PDF discovery, copying, text extraction, and routing
-    into the corpus structure used for TF-IDF indexing.
+    into the corpus structure used for TF-IDF indexing. Copies and
+    extraction are streamed, so ingestion runs in bounded memory
+    however large the manual is.
+
+    Manuals can also be removed again. Their passages are tombstoned in
+    the published index right away, so no rebuild is needed before they
+    stop showing up in results.
 
 Author: Kunal Sinha
 Course: CS410 - Text Information Systems (Fall 2025), UIUC
 """
 
 import os
-from config import MANUALS_ROOT, CORPUS_ROOT
-from extract_pdfs import process_pdf_with_pages
-from segment_passages import build_passages
+import re
+import json
+import shutil
+import threading
+from pathlib import Path
+
+from config import MANUALS_ROOT, CORPUS_ROOT, INDEX_ROOT
+import index_store
+from index_reader import manual_rows
+from extract_pdfs import iter_pdf_pages, summarize_extraction, write_extraction_log
+from segment_passages import page_records, write_passages, passages_path
+
+# Buffer size when streaming uploads into the manuals store
+COPY_CHUNK = 1024 * 1024
+
+# Rewrites of one make's passages file are serialized; different makes
+# (bulk ingestion runs one thread per car) proceed in parallel
+_passages_locks = {}
+_passages_locks_guard = threading.Lock()
 
 
 def find_all_pdfs(path):
@@ -26,13 +48,86 @@ def find_all_pdfs(path):
     return pdfs
 
 
+def store_pdf(src, dest_dir):
+    """
+    Stream a PDF into dest_dir and return its new path. `src` is either a
+    path (copied with shutil.copyfile, which uses sendfile/copy_file_range
+    where the OS has them) or a readable file object with a .name, such as
+    a Streamlit upload (copied in COPY_CHUNK pieces). The copy lands under
+    a temporary name first, so a half-written PDF is never left behind.
+    """
+    name = os.path.basename(src if isinstance(src, str) else src.name)
+    dest = os.path.join(dest_dir, name)
+    tmp = f"{dest}.part-{os.getpid()}-{threading.get_ident()}"
+
+    try:
+        if isinstance(src, str):
+            shutil.copyfile(src, tmp)
+        else:
+            if hasattr(src, "seek"):
+                src.seek(0)
+            with open(tmp, "wb") as out:
+                shutil.copyfileobj(src, out, COPY_CHUNK)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return dest
+
+
+def _passages_lock(make):
+    with _passages_locks_guard:
+        return _passages_locks.setdefault(make, threading.Lock())
+
+
+def _read_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _manual_records(make, model, pdf_paths, failed):
+    """
+    Passage records of every PDF, streamed page by page from the extractor.
+    Which extraction path each page took is saved under
+    data/corpus/<make>/extraction/<pdf>.json. The source_pdf names of PDFs
+    whose extraction failed are added to `failed`; records they yielded
+    before the error are not usable.
+    """
+    log_dir = os.path.join(CORPUS_ROOT, make, "extraction")
+    os.makedirs(log_dir, exist_ok=True)
+
+    for pdf in pdf_paths:
+        log = []
+        try:
+            yield from page_records(make, model, Path(pdf).stem, iter_pdf_pages(pdf, log))
+        except Exception as e:
+            print(f"Error processing {pdf}: {e}")
+            failed.add(f"{Path(pdf).stem}.pdf")
+        if log:
+            write_extraction_log(pdf, log, os.path.join(log_dir, f"{Path(pdf).stem}.json"))
+            methods = summarize_extraction(log)["methods"]
+            print(f" - {os.path.basename(pdf)}: "
+                  + ", ".join(f"{n} pages via {m}" for m, n in methods.items()))
+
+
 def add_manual(make, model, pdf_paths):
     """
     Add a new manual to the system.
     Args:
         make (str): manufacturer name
         model (str): model name
-        pdf_paths (List[str]): absolute paths to PDF files
+        pdf_paths (List[str | file]): paths to PDF files, or uploaded
+            file objects with a .name
+
+    Each PDF is streamed into data/manuals/<make>/, then its pages go
+    straight from the extractor through the segmenter into a staging
+    file, with no per-page text files, which is merged into the make's
+    passages file. Re-adding a PDF replaces its earlier passages, unless
+    its extraction fails: then the earlier passages are kept.
+
+    Returns the names of the PDFs that could not be extracted (empty if
+    all were added).
     """
 
     make = make.lower()
@@ -48,24 +143,99 @@ def add_manual(make, model, pdf_paths):
 
     # Copy PDFs locally into data/manuals/<make>/
     for src_pdf in pdf_paths:
-        dest = os.path.join(manual_root, os.path.basename(src_pdf))
-        with open(src_pdf, "rb") as fsrc, open(dest, "wb") as fdst:
-            fdst.write(fsrc.read())
+        dest = store_pdf(src_pdf, manual_root)
 
-        print(f" - Copied {os.path.basename(src_pdf)}")
+        print(f" - Copied {os.path.basename(dest)}")
         copied_pdf_paths.append(dest)
 
-    # Extract raw text into data/corpus/<make>/raw_text/
-    raw_text_dir = os.path.join(CORPUS_ROOT, make, "raw_text")
-    os.makedirs(raw_text_dir, exist_ok=True)
-
-    print("\nExtracting text pages...")
-    for pdf in copied_pdf_paths:
-        process_pdf_with_pages(pdf, raw_text_dir)
-
-    # Segment passages
-    print("Segmenting into passages...")
-    build_passages(make, model)
+    # Extract and segment into data/corpus/<make>/passages/
+    print("\nExtracting and segmenting pages...")
+    sources = {f"{Path(p).stem}.pdf" for p in copied_pdf_paths}
+    failed = set()
+    staged = f"{passages_path(make)}.staged-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(os.path.dirname(staged), exist_ok=True)
+    try:
+        # Extraction is the slow part, so it runs outside the lock into a
+        # staging file that is then merged into the passages file
+        with open(staged, "w", encoding="utf-8") as f:
+            for obj in _manual_records(make, model, copied_pdf_paths, failed):
+                f.write(json.dumps(obj) + "\n")
+        # A PDF that failed keeps whatever passages it had before
+        records = (obj for obj in _read_records(staged) if obj["source_pdf"] not in failed)
+        with _passages_lock(make):
+            count = write_passages(make, records, replace_sources=sources - failed)
+    finally:
+        if os.path.exists(staged):
+            os.remove(staged)
+
+    if failed:
+        print(f"\nNot added (earlier passages kept): {', '.join(sorted(failed))}")
+        print(f"{count} passages added from the other PDFs.")
+    else:
+        print(f"\nManual added successfully ({count} passages).")
+    return sorted(failed)
+
+
+def remove_manual(make, source_pdf):
+    """
+    Remove a manual from the system without rebuilding the index.
+    Args:
+        make (str): manufacturer name
+        source_pdf (str): PDF file name (or path) as it was added; the
+            case does not need to match
+
+    The manual's passages are marked deleted in the tombstone bitmap of
+    the published index generation, which search() masks out from the
+    next query on. Its passages, stored PDF, extraction log and any
+    per-page text files are deleted, so the next build leaves it out.
+    Run `python src/tfidf_indexer.py --compact` to drop the tombstoned
+    rows from the index itself.
+
+    Returns the number of indexed passages that were tombstoned. Raises
+    ValueError if the make has no such manual.
+    """
 
-    print("\nManual added successfully.")
-    return True
+    make = make.lower()
+    source_pdf = os.path.basename(source_pdf)
+    wanted = source_pdf.lower()
+
+    # Hide it from search first
+    generation, index_dir = index_store.current_index_dir(INDEX_ROOT)
+    matched = removed = 0
+    if os.path.isdir(index_dir):
+        rows, n_rows = manual_rows(index_dir, make, source_pdf)
+        matched = rows.size
+        if matched:
+            removed = index_store.add_tombstones(generation, rows, n_rows, INDEX_ROOT)
+
+    # Then drop it from the corpus so rebuilds do not bring it back
+    with _passages_lock(make):
+        names = set()
+        if os.path.exists(passages_path(make)):
+            names = {obj["source_pdf"] for obj in _read_records(passages_path(make))
+                     if obj["source_pdf"].lower() == wanted}
+            if names:
+                write_passages(make, (), replace_sources=names)
+
+    manual_dir = os.path.join(MANUALS_ROOT, make)
+    stored = [f for f in os.listdir(manual_dir) if f.lower() == wanted] if os.path.isdir(manual_dir) else []
+    if not matched and not names and not stored:
+        raise ValueError(f"No manual named {source_pdf} for make {make}.")
+
+    raw_dir = os.path.join(CORPUS_ROOT, make, "raw_text")
+    raw_files = os.listdir(raw_dir) if os.path.isdir(raw_dir) else []
+    leftovers = [os.path.join(manual_dir, f) for f in stored]
+    for stem in {Path(name).stem for name in names | set(stored) | {source_pdf}}:
+        leftovers += [
+            os.path.join(CORPUS_ROOT, make, "extraction", f"{stem}.json"),
+            os.path.join(raw_dir, f"{stem}_extraction.json"),
+        ]
+        # Exactly <stem>_page<n>.txt, so foo.pdf leaves foo_page2.pdf's pages alone
+        page_file = re.compile(re.escape(stem) + r"_page\d+\.txt")
+        leftovers += [os.path.join(raw_dir, f) for f in raw_files if page_file.fullmatch(f)]
+    for path in leftovers:
+        if os.path.exists(path):
+            os.remove(path)
+
+    print(f"Removed {source_pdf} ({removed} indexed passages tombstoned).")
+    return removed
@@ -0,0 +1,219 @@
+"""
+Filename: page_classifier.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Page classifier that sits between PDF extraction and passage
+    segmentation. Each extracted page is tagged as one of:
+
+        - prose    running text (procedures, descriptions, cautions)
+        - table    torque-spec grids, connector/pin tables, parts lists
+        - diagram  wiring-diagram labels and glyph-only artwork
+
+    and handled according to its type:
+
+        - prose    segmented into sentence passages, full weight
+        - table    kept as a single passage per page, down-weighted
+        - diagram  skipped (wire colours and pin numbers carry no
+                   searchable meaning and used to become thousands of
+                   tiny passages)
+
+    The page type is stored on every passage record, and the index keeps
+    a per-passage weight array that search() multiplies into the scores.
+
+    Run as a script to see how pages classify and how much index size
+    and query time the classification saves on the current corpus:
+
+        python src/page_classifier.py
+        python src/page_classifier.py --makes subaru --repeat 20
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import os
+import re
+import json
+import argparse
+
+from config import CORPUS_ROOT
+
+PAGE_TYPES = ("prose", "table", "diagram")
+
+# How each page type is segmented: "sentences", "page" (one passage) or "skip"
+PAGE_SEGMENTATION = {"prose": "sentences", "table": "page", "diagram": "skip"}
+
+# Score multiplier for passages of each page type
+PAGE_WEIGHTS = {"prose": 1.0, "table": 0.7, "diagram": 0.5}
+
+# Thresholds on token shares (see page_features)
+DIAGRAM_MAX_WORDS = 0.30     # diagrams have almost no ordinary words...
+DIAGRAM_MIN_CODES = 0.40     # ...but lots of wire/connector codes (W-B, A12)
+DIAGRAM_MIN_SHORT = 0.80     # ...or consist of 1-3 token label lines
+DIAGRAM_MIN_GLYPHS = 0.50    # ...or are mostly unmapped glyphs, i.e. artwork
+TABLE_MIN_NUMBERS = 0.35
+TABLE_MIXED_NUMBERS = 0.22
+TABLE_MIXED_MAX_WORDS = 0.45
+TABLE_MIN_CELLS = 0.45
+TABLE_CELLS_MAX_WORDS = 0.50
+
+_GLYPH = re.compile(r"\(cid:\d+\)")
+_NUMBER = re.compile(r"^[\d.,:/%±+\-–{}()x×]+$")
+_CODE = re.compile(r"^(?:[A-Z0-9]{1,3}(?:[–-][A-Z0-9]{1,3})?|[A-Z]{1,3}\d+[A-Z]?)$")
+_WORD = re.compile(r"^[A-Za-z][a-z]{2,}[.,:;)]?$")
+
+
+def page_features(text):
+    """Token shares used by classify_page(). None for a page without tokens."""
+    glyphs = len(_GLYPH.findall(text))
+    text = _GLYPH.sub(" ", text)
+    tokens = text.split()
+    if not tokens:
+        return None
+
+    lines = [line.split() for line in text.splitlines() if line.strip()]
+    n = len(tokens)
+    return {
+        "words": sum(1 for t in tokens if _WORD.match(t)) / n,
+        "numbers": sum(1 for t in tokens if _NUMBER.match(t)) / n,
+        "codes": sum(1 for t in tokens if _CODE.match(t)) / n,
+        "short_lines": sum(1 for line in lines if len(line) <= 3) / len(lines),
+        "glyphs": glyphs / (glyphs + n),
+    }
+
+
+def classify_page(text):
+    """Return "prose", "table" or "diagram" for the text of one page."""
+    f = page_features(text)
+    if f is None:
+        return "diagram" if _GLYPH.search(text) else "prose"
+
+    if f["words"] < DIAGRAM_MAX_WORDS and (
+        f["codes"] >= DIAGRAM_MIN_CODES
+        or f["short_lines"] >= DIAGRAM_MIN_SHORT
+        or f["glyphs"] > DIAGRAM_MIN_GLYPHS
+    ):
+        return "diagram"
+
+    if (f["numbers"] >= TABLE_MIN_NUMBERS
+            or (f["numbers"] >= TABLE_MIXED_NUMBERS and f["words"] < TABLE_MIXED_MAX_WORDS)
+            or (f["numbers"] + f["codes"] >= TABLE_MIN_CELLS
+                and f["words"] < TABLE_CELLS_MAX_WORDS)):
+        return "table"
+    return "prose"
+
+
+# Savings report
+
+def _pages_from_passages(make):
+    """
+    Passages of a make grouped by page, in file order, with the page's
+    raw text when data/corpus/<make>/raw_text still has it.
+    """
+    path = os.path.join(CORPUS_ROOT, make, "passages", f"{make}_passages.jsonl")
+    raw_dir = os.path.join(CORPUS_ROOT, make, "raw_text")
+    pages = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            key = (record["source_pdf"], record["page_number"])
+            pages.setdefault(key, []).append(record["text"])
+
+    for (pdf, page), texts in pages.items():
+        raw_path = os.path.join(raw_dir, f"{os.path.splitext(pdf)[0]}_page{page}.txt")
+        if os.path.exists(raw_path):
+            with open(raw_path, "r", encoding="utf-8") as f:
+                raw = f.read()
+        else:
+            raw = "\n".join(texts)
+        yield raw, texts
+
+
+def _index_stats(passages, queries, repeat):
+    """Fit a TF-IDF index like tfidf_indexer does and time scoring the queries."""
+    import contextlib
+    import io
+    import time
+    import numpy as np
+    from tfidf_indexer import build_tfidf
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        vectorizer, matrix = build_tfidf(passages)
+    matrix = matrix.tocsr()
+
+    samples = []
+    for _ in range(repeat):
+        for q in queries:
+            start = time.perf_counter()
+            scores = (matrix @ vectorizer.transform([q]).T).toarray().ravel()
+            np.argpartition(-scores, min(5, scores.size - 1))[:5]
+            samples.append((time.perf_counter() - start) * 1000.0)
+
+    return {
+        "passages": matrix.shape[0],
+        "vocabulary": matrix.shape[1],
+        "nnz": int(matrix.nnz),
+        "matrix_mb": (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 2**20,
+        "query_p50_ms": float(np.percentile(samples, 50)),
+        "query_mean_ms": float(np.mean(samples)),
+    }
+
+
+def savings_report(makes=None, repeat=10):
+    """Compare the index built from all passages with the classified one."""
+    from query_normalizer import normalize_query
+    from evaluate import TEST_QUERIES
+
+    if not makes:
+        makes = sorted(
+            m for m in os.listdir(CORPUS_ROOT)
+            if os.path.exists(os.path.join(CORPUS_ROOT, m, "passages", f"{m}_passages.jsonl"))
+        )
+
+    counts = {t: 0 for t in PAGE_TYPES}
+    baseline, classified = [], []
+    for make in makes:
+        for raw, texts in _pages_from_passages(make):
+            page_type = classify_page(raw)
+            counts[page_type] += 1
+            baseline.extend(texts)
+            mode = PAGE_SEGMENTATION[page_type]
+            if mode == "sentences":
+                classified.extend(texts)
+            elif mode == "page":
+                classified.append(" ".join(texts))
+
+    queries = [normalize_query(q) for q in TEST_QUERIES]
+    return {
+        "makes": makes,
+        "pages": counts,
+        "baseline": _index_stats(baseline, queries, repeat),
+        "classified": _index_stats(classified, queries, repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Page classification savings report.")
+    parser.add_argument("--makes", nargs="+", help="Makes to include (default: all)")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs of the query set")
+    parser.add_argument("--out", help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    report = savings_report(args.makes, args.repeat)
+
+    pages = report["pages"]
+    print(f"\nPages: {sum(pages.values())}  "
+          + "  ".join(f"{t}={pages[t]}" for t in PAGE_TYPES))
+    print(f"\n{'':14} {'baseline':>12} {'classified':>12} {'saved':>8}")
+    for key in ("passages", "vocabulary", "nnz", "matrix_mb", "query_p50_ms", "query_mean_ms"):
+        old, new = report["baseline"][key], report["classified"][key]
+        saved = (old - new) / old if old else 0.0
+        print(f"{key:14} {old:12.2f} {new:12.2f} {saved:8.1%}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Filename: query_log.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Opt-in capture of real search traffic, plus an offline replay tool
+    for capacity planning.
+
+    With AUTOASSIST_QUERY_LOG set (see config.py), every search() call
+    appends one JSON line: timestamp, source (cli, app, server), raw and
+    normalized query, detected make, search options, top-k doc_ids,
+    latency and whether the index cache was hit. Entries are handed to a
+    background writer thread through a queue, so a search never waits on
+    disk. The file is only ever appended to.
+
+    Replay drives search() (in-process) or a running search_server.py
+    (--url) with the logged queries and options at a chosen concurrency,
+    and reports throughput, tail latency and how many result lists
+    changed compared to the log.
+
+    Usage:
+        AUTOASSIST_QUERY_LOG=queries.jsonl streamlit run src/app.py
+        python src/query_log.py replay queries.jsonl --concurrency 8 --loops 3
+        python src/query_log.py replay queries.jsonl --url http://127.0.0.1:8410
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import argparse
+import threading
+
+from config import QUERY_LOG_PATH
+
+# Entries written per batch by the writer thread
+WRITE_BATCH = 256
+
+# Tag for entries from this process; entry points set it with set_source()
+_state = {"source": None, "path": QUERY_LOG_PATH, "writer": None, "pid": None}
+_start_lock = threading.Lock()
+
+
+def set_source(name):
+    """Label the entries of this process (cli, app, server, ...)."""
+    _state["source"] = name
+
+
+def enabled():
+    return bool(_state["path"])
+
+
+def disable():
+    """Stop logging in this process (used by replay so it does not log itself)."""
+    _state["path"] = None
+
+
+class _Writer:
+    """Background thread appending queued entries to the log file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="query-log", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                return
+            batch = [entry]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    entry = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    self._write(batch)
+                    return
+                batch.append(entry)
+            self._write(batch)
+
+    def _write(self, batch):
+        data = "".join(json.dumps(e, default=str) + "\n" for e in batch)
+        try:
+            # One append per batch keeps lines from several processes whole
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+        except OSError:
+            pass  # logging must never break searching
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+
+
+def _writer():
+    # Threads do not survive fork(), so every process starts its own writer
+    if _state["writer"] is None or _state["pid"] != os.getpid():
+        with _start_lock:
+            if _state["writer"] is None or _state["pid"] != os.getpid():
+                _state["writer"] = _Writer(_state["path"])
+                _state["pid"] = os.getpid()
+    return _state["writer"]
+
+
+def log_search(raw_query, query, car_make, options, results, latency_ms, cache_hit):
+    """Queue one search for the log. No-op unless logging is enabled."""
+    if not _state["path"]:
+        return
+    _writer().queue.put({
+        "ts": time.time(),
+        "source": _state["source"],
+        "raw_query": raw_query,
+        "query": query,
+        "car_make": car_make,
+        "options": options,
+        "doc_ids": [r.get("doc_id") for r in results],
+        "latency_ms": round(latency_ms, 3),
+        "cache_hit": cache_hit,
+    })
+
+
+@atexit.register
+def flush():
+    """Write out everything still queued (called automatically at exit)."""
+    writer = _state["writer"]
+    if writer is not None and _state["pid"] == os.getpid():
+        writer.close()
+        _state["writer"] = None
+
+
+# Replay
+
+def read_log(path):
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue  # a line cut short by a crash
+    return entries
+
+
+def _local_runner():
+    from search_engine import search
+
+    def run(entry):
+        options = entry.get("options") or {}
+        results = search(entry["query"], car_make=entry.get("car_make"), **options)
+        return [r.get("doc_id") for r in results]
+    return run
+
+
+def _http_runner(url):
+    from urllib.request import Request, urlopen
+
+    endpoint = url.rstrip("/") + "/search"
+
+    def run(entry):
+        options = entry.get("options") or {}
+        body = {
+            "q": entry["query"],
+            "normalize": False,
+            "spell": False,
+            "make": entry.get("car_make") or "none",
+            "k": options.get("top_k", 5),
+            "collapse": options.get("collapse_pages", False),
+            "rerank": options.get("rerank", False),
+        }
+        if "candidates" in options:
+            body["candidates"] = options["candidates"]
+        for field, name in (("make", "make"), ("model", "model"), ("source_pdf", "pdf")):
+            if (options.get("filters") or {}).get(field):
+                body[f"filter_{name}"] = options["filters"][field]
+        request = Request(endpoint, data=json.dumps(body).encode("utf-8"),
+                          headers={"Content-Type": "application/json"})
+        with urlopen(request, timeout=30) as response:
+            payload = json.loads(response.read())
+        return [r.get("doc_id") for r in payload["results"]]
+    return run
+
+
+def replay(entries, concurrency=4, loops=1, url=None, warmup=True):
+    """
+    Run every logged search `loops` times with `concurrency` workers,
+    each taking the next entry as soon as it is free (closed loop).
+    """
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+
+    run = _http_runner(url) if url else _local_runner()
+    workload = [e for e in entries if e.get("query")] * loops
+    if not workload:
+        raise SystemExit("No replayable entries in the log.")
+    if warmup:
+        run(workload[0])
+
+    latencies = [0.0] * len(workload)
+    changed = [False] * len(workload)
+    errors = []
+
+    def task(i):
+        entry = workload[i]
+        start = time.perf_counter()
+        try:
+            doc_ids = run(entry)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+            return
+        latencies[i] = (time.perf_counter() - start) * 1000.0
+        changed[i] = doc_ids != entry.get("doc_ids")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(task, range(len(workload))))
+    wall = time.perf_counter() - start
+
+    ok = len(workload) - len(errors)
+    lat = np.array([ms for ms in latencies if ms > 0.0] or [0.0])
+    return {
+        "target": url or "in-process",
+        "concurrency": concurrency,
+        "requests": len(workload),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_s": wall,
+        "throughput_qps": ok / wall if wall else 0.0,
+        "latency_ms": {
+            "mean": float(lat.mean()),
+            "p50": float(np.percentile(lat, 50)),
+            "p95": float(np.percentile(lat, 95)),
+            "p99": float(np.percentile(lat, 99)),
+            "max": float(lat.max()),
+        },
+        "results_changed": sum(changed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a query log against the search engine.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rp = sub.add_parser("replay", help="Drive search with logged traffic")
+    rp.add_argument("log", help="Query log (JSON lines)")
+    rp.add_argument("--concurrency", type=int, nargs="+", default=[1, 4],
+                    help="Concurrent workers; several values run one pass each")
+    rp.add_argument("--loops", type=int, default=1, help="Times to replay the whole log")
+    rp.add_argument("--url", help="Replay against a running search_server.py instead")
+    rp.add_argument("--limit", type=int, help="Use only the first N entries")
+    rp.add_argument("--out", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    disable()
+    entries = read_log(args.log)
+    if args.limit:
+        entries = entries[:args.limit]
+    print(f"Replaying {len(entries)} logged searches x {args.loops} "
+          f"against {args.url or 'in-process search()'}")
+
+    reports = []
+    print(f"\n{'workers':>8} {'requests':>9} {'qps':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8} {'errors':>7} {'changed':>8}")
+    for concurrency in args.concurrency:
+        r = replay(entries, concurrency, args.loops, args.url)
+        reports.append(r)
+        lat = r["latency_ms"]
+        print(f"{concurrency:8d} {r['requests']:9d} {r['throughput_qps']:9.1f} {lat['p50']:8.1f} "
+              f"{lat['p95']:8.1f} {lat['p99']:8.1f} {lat['max']:8.1f} {r['errors']:7d} "
+              f"{r['results_changed']:8d}")
+        for sample in r["error_samples"]:
+            print(f"         {sample}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+        print(f"\nSaved -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
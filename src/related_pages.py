@@ -0,0 +1,238 @@
+"""
+Filename: related_pages.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Precomputed "related pages" for more-like-this browsing. Once a
+    technician finds the right page, the same component or procedure in
+    the other manuals (e.g. the Civic and the Camry versions of a brake
+    caliper job) is one lookup away, with no scoring at query time.
+
+    Built offline over the published index generation:
+
+        - Each page gets a vector: the sum of its passages' TF-IDF rows,
+          L2-normalized.
+        - Page-by-page cosine similarities are computed as blocked sparse
+          products (a block of pages against all pages), so memory stays
+          bounded by BLOCK_BYTES whatever the corpus size. Blocks run in
+          a pool of worker processes.
+        - The top-N neighbours of every page (by default only pages of
+          other manuals) are kept as int32 page ids with float16 scores.
+
+    Files go to data/corpus/index/related/<generation>/, next to the
+    dense index, so neighbour lists always match the rows they were
+    computed from. search_engine.more_like_this() and the UI read them.
+
+    Usage:
+        python src/related_pages.py
+        python src/related_pages.py --neighbors 20 --include-same-manual
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import threading
+import numpy as np
+
+from config import INDEX_ROOT
+import index_store
+
+RELATED_DIR = "related"
+DEFAULT_NEIGHBORS = 10
+
+# Upper bound on the dense similarity block each worker holds at a time
+BLOCK_BYTES = 64 * 2**20
+
+_related_cache = {"key": None, "index": None}
+_related_lock = threading.Lock()
+
+# Page matrices of the worker processes (set once by _init_worker)
+_worker = {}
+
+
+def related_dir(generation, index_root=INDEX_ROOT):
+    return os.path.join(index_root, RELATED_DIR, generation or "legacy")
+
+
+def related_available(generation=None, index_root=INDEX_ROOT):
+    if generation is None:
+        generation = index_store.current_generation(index_root)
+    return os.path.exists(os.path.join(related_dir(generation, index_root), "related.json"))
+
+
+# Offline build
+
+def page_vectors(tfidf_matrix, page_ids, weights=None):
+    """
+    (page_matrix, page_rows): one L2-normalized row per page id summing
+    the page's passage rows, and the first passage row of every page.
+    """
+    from scipy.sparse import csr_matrix, diags
+
+    n = tfidf_matrix.shape[0]
+    n_pages = int(page_ids.max()) + 1 if n else 0
+    values = np.ones(n, dtype=np.float32) if weights is None else np.asarray(weights, np.float32)
+    membership = csr_matrix((values, (page_ids, np.arange(n))), shape=(n_pages, n))
+    pages = (membership @ tfidf_matrix.astype(np.float32)).tocsr()
+
+    norms = np.sqrt(np.asarray(pages.multiply(pages).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    pages = (diags(1.0 / norms) @ pages).tocsr()
+
+    _, page_rows = np.unique(page_ids, return_index=True)
+    return pages, page_rows.astype(np.int32)
+
+
+def _init_worker(pages, pages_t, page_sources, k, same_manual):
+    _worker.update(pages=pages, pages_t=pages_t, sources=page_sources,
+                   k=k, same_manual=same_manual)
+
+
+def _neighbor_block(bounds):
+    """Top-k neighbours of pages lo..hi: (ids, scores), -1 where there are fewer."""
+    lo, hi = bounds
+    pages, sources, k = _worker["pages"], _worker["sources"], _worker["k"]
+
+    sims = (pages[lo:hi] @ _worker["pages_t"]).toarray()
+    rows = np.arange(hi - lo)
+    if _worker["same_manual"]:
+        sims[rows, rows + lo] = 0.0
+    else:
+        sims[sources[lo:hi, None] == sources[None, :]] = 0.0
+
+    k_eff = min(k, sims.shape[1])
+    top = np.argpartition(-sims, k_eff - 1, axis=1)[:, :k_eff]
+    top_sims = np.take_along_axis(sims, top, axis=1)
+    order = np.argsort(-top_sims, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_sims = np.take_along_axis(top_sims, order, axis=1)
+
+    ids = np.full((hi - lo, k), -1, dtype=np.int32)
+    scores = np.zeros((hi - lo, k), dtype=np.float16)
+    ids[:, :k_eff] = np.where(top_sims > 0, top, -1)
+    scores[:, :k_eff] = np.maximum(top_sims, 0)
+    return ids, scores
+
+
+def build_related_index(k=DEFAULT_NEIGHBORS, same_manual=False, jobs=None,
+                        index_root=INDEX_ROOT):
+    """Compute and store the neighbour lists of every page of the current generation."""
+    from search_engine import current_index
+
+    start = time.perf_counter()
+    state = current_index()
+    pages, page_rows = page_vectors(
+        state["tfidf_matrix"], np.asarray(state["page_ids"]), state["passage_weights"]
+    )
+    n_pages = pages.shape[0]
+    page_sources = np.asarray(state["source_codes"])[page_rows]
+    print(f"{n_pages} pages, {pages.nnz} non-zeros")
+
+    block = max(1, min(n_pages, BLOCK_BYTES // (8 * max(n_pages, 1))))
+    blocks = [(lo, min(n_pages, lo + block)) for lo in range(0, n_pages, block)]
+    jobs = min(jobs or os.cpu_count() or 1, len(blocks))
+    init_args = (pages, pages.T.tocsr(), page_sources, k, same_manual)
+
+    ids = np.empty((n_pages, k), dtype=np.int32)
+    scores = np.empty((n_pages, k), dtype=np.float16)
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=init_args) as pool:
+            parts = pool.map(_neighbor_block, blocks)
+            for (lo, hi), (block_ids, block_scores) in zip(blocks, parts):
+                ids[lo:hi], scores[lo:hi] = block_ids, block_scores
+                print(f"\rNeighbours for {hi}/{n_pages} pages", end="", flush=True)
+    else:
+        _init_worker(*init_args)
+        for lo, hi in blocks:
+            ids[lo:hi], scores[lo:hi] = _neighbor_block((lo, hi))
+            print(f"\rNeighbours for {hi}/{n_pages} pages", end="", flush=True)
+    print()
+
+    out_dir = related_dir(state["generation"], index_root)
+    tmp_dir = out_dir + f".build-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "neighbors.npy"), ids)
+    np.save(os.path.join(tmp_dir, "scores.npy"), scores)
+    np.save(os.path.join(tmp_dir, "page_rows.npy"), page_rows)
+
+    info = {
+        "generation": state["generation"],
+        "pages": int(n_pages),
+        "neighbors": int(k),
+        "same_manual": bool(same_manual),
+        "workers": int(jobs),
+        "build_seconds": round(time.perf_counter() - start, 3),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(tmp_dir, "related.json"), "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+
+    # Swap in the finished directory, then drop lists of removed generations
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.rename(tmp_dir, out_dir)
+    live = set(index_store.list_generations(index_root)) | {"legacy"}
+    root = os.path.join(index_root, RELATED_DIR)
+    for name in os.listdir(root):
+        if name not in live and ".build-" not in name:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    print(f"Related pages saved -> {out_dir} ({info['build_seconds']} s)")
+    return info
+
+
+# Query time
+
+def load_related(generation, index_root=INDEX_ROOT):
+    """Memory-map the neighbour lists of a generation (cached). None if not built."""
+    key = (index_root, generation)
+    if _related_cache["key"] == key:
+        return _related_cache["index"]
+
+    with _related_lock:
+        if _related_cache["key"] == key:
+            return _related_cache["index"]
+
+        path = related_dir(generation, index_root)
+        related = None
+        if os.path.exists(os.path.join(path, "related.json")):
+            with open(os.path.join(path, "related.json"), "r", encoding="utf-8") as f:
+                related = json.load(f)
+            for name in ("neighbors", "scores", "page_rows"):
+                related[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        _related_cache["index"] = related
+        _related_cache["key"] = key
+        return related
+
+
+def neighbors(related, page_id, n=None):
+    """(passage_rows, scores) of the pages related to `page_id`, best first."""
+    ids = np.asarray(related["neighbors"][page_id][:n])
+    scores = np.asarray(related["scores"][page_id][:n], dtype=np.float32)
+    keep = ids >= 0
+    return np.asarray(related["page_rows"])[ids[keep]], scores[keep]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the related-pages neighbour lists.")
+    parser.add_argument("--neighbors", type=int, default=DEFAULT_NEIGHBORS,
+                        help="Neighbours stored per page")
+    parser.add_argument("--include-same-manual", action="store_true",
+                        help="Also link pages of the same PDF")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    build_related_index(args.neighbors, args.include_same_manual, args.jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Filename: remove_manual.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Command-line interface for removing a manual. Wraps
+    manual_tools.remove_manual, which hides the manual's passages from
+    search immediately; compaction or the next rebuild drops them from
+    the index.
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import argparse
+from manual_tools import remove_manual
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove a car manual.")
+    parser.add_argument("--make", required=True)
+    parser.add_argument("--pdf", required=True, nargs="+",
+                        help="PDF file name(s) as they were added")
+
+    args = parser.parse_args()
+
+    missing = []
+    for pdf in args.pdf:
+        try:
+            remove_manual(args.make, pdf)
+        except ValueError as e:
+            print(f"Error: {e}")
+            missing.append(pdf)
+
+    print("\nRun: python src/tfidf_indexer.py --compact  to reclaim the index rows.")
+    if missing:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
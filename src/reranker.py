@@ -0,0 +1,168 @@
+"""
+Filename: reranker.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Second stage of the search pipeline. The sparse TF-IDF scorer picks a
+    few hundred candidate passages. This module re-scores only those
+    candidates with features that are too expensive to compute for every
+    passage:
+
+        - tfidf    first-stage cosine score (scaled to the best candidate)
+        - bm25     Okapi BM25 over the query's vocabulary terms
+        - phrase   share of adjacent query word pairs found as a phrase
+        - proximity how tightly the matched query terms cluster together
+        - action   passage contains repair steps (check, inspect, replace...)
+        - make     passage belongs to the detected manufacturer
+
+    The final score is a weighted sum of these features. Cost depends only
+    on the number of candidates, not on the size of the corpus.
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import re
+import numpy as np
+
+# Words that mark a passage as containing actionable repair steps
+ACTION_KEYWORDS = ["check", "inspect", "replace", "adjust", "diagnose", "verify"]
+
+# How many first-stage candidates are re-ranked
+RERANK_CANDIDATES = 300
+
+# Feature weights of the final score
+RERANK_WEIGHTS = {
+    "tfidf": 1.0,
+    "bm25": 0.6,
+    "phrase": 0.3,
+    "proximity": 0.2,
+    "action": 0.1,
+    "make": 0.5,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Token pattern of TfidfVectorizer, so terms line up with the vocabulary
+_TOKEN_RE = re.compile(r"\b\w\w+\b")
+_ACTION_RE = re.compile(r"\b(?:" + "|".join(ACTION_KEYWORDS) + r")", re.IGNORECASE)
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _avg_doc_len(state):
+    """
+    Mean passage length in tokens. Read from doc_lengths.npy with the
+    index; indexes without it are measured once per load.
+    """
+    if state.get("avg_doc_len") is None:
+        lengths = [len(_TOKEN_RE.findall(m["text"])) for m in state["metadata"]]
+        state["avg_doc_len"] = float(np.mean(lengths)) if lengths else 1.0
+    return state["avg_doc_len"]
+
+
+def _query_terms(state, query):
+    """
+    Distinct query words present in the index vocabulary, their BM25 idf,
+    and the adjacent word pairs used for phrase matching. Expects
+    state["doc_freq"] to be filled (search_engine._doc_freq).
+    """
+    vocabulary = state["vectorizer"].vocabulary_
+    stop_words = state["vectorizer"].get_stop_words() or ()
+    words = [w for w in tokenize(query) if w not in stop_words]
+
+    terms = [w for w in dict.fromkeys(words) if w in vocabulary]
+    n = state["tfidf_matrix"].shape[0]
+    df = state["doc_freq"][[vocabulary[t] for t in terms]] if terms else np.empty(0)
+    idf = np.log1p((n - df + 0.5) / (df + 0.5))
+
+    pairs = {(a, b) for a, b in zip(words, words[1:]) if a != b}
+    return terms, idf, pairs, stop_words
+
+
+def _proximity(positions, n_terms):
+    """
+    1.0 when all matched terms sit next to each other, falling towards 0
+    as the smallest window containing every matched term grows.
+    """
+    if n_terms < 2:
+        return 0.0
+
+    # positions: sorted (token_position, term_id); minimum covering window
+    counts = {}
+    left = 0
+    best = None
+    for right, (pos, term) in enumerate(positions):
+        counts[term] = counts.get(term, 0) + 1
+        while len(counts) == n_terms:
+            span = pos - positions[left][0] + 1
+            if best is None or span < best:
+                best = span
+            old = positions[left][1]
+            counts[old] -= 1
+            if not counts[old]:
+                del counts[old]
+            left += 1
+    return n_terms / best if best else 0.0
+
+
+def features(state, query, candidates, first_scores, car_make=None):
+    """Feature matrix (len(candidates) x len(RERANK_WEIGHTS)), columns in weight order."""
+    metadata = state["metadata"]
+    terms, idf, pairs, stop_words = _query_terms(state, query)
+    term_ids = {t: i for i, t in enumerate(terms)}
+    avgdl = _avg_doc_len(state)
+
+    make_code = None
+    if car_make:
+        make_code = state["make_index"].get(car_make.lower())
+
+    rows = np.zeros((len(candidates), len(RERANK_WEIGHTS)), dtype=np.float64)
+    best_first = first_scores.max() if first_scores.size else 0.0
+    if best_first > 0:
+        rows[:, 0] = first_scores / best_first
+
+    for row, idx in enumerate(candidates):
+        text = metadata[idx]["text"]
+        tokens = tokenize(text)
+
+        tf = np.zeros(len(terms))
+        positions = []
+        for pos, tok in enumerate(tokens):
+            tid = term_ids.get(tok)
+            if tid is not None:
+                tf[tid] += 1
+                positions.append((pos, tid))
+
+        if terms:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / avgdl)
+            rows[row, 1] = float(np.sum(idf * tf * (BM25_K1 + 1) / (tf + norm)))
+
+        if pairs:
+            content = [t for t in tokens if t not in stop_words]
+            found = set(zip(content, content[1:])) & pairs
+            rows[row, 2] = len(found) / len(pairs)
+
+        rows[row, 3] = _proximity(positions, int(np.count_nonzero(tf)))
+        rows[row, 4] = 1.0 if _ACTION_RE.search(text) else 0.0
+
+    best_bm25 = rows[:, 1].max() if len(candidates) else 0.0
+    if best_bm25 > 0:
+        rows[:, 1] /= best_bm25
+
+    if make_code is not None:
+        rows[:, 5] = state["make_codes"][candidates] == make_code
+
+    return rows
+
+
+def rerank(state, query, candidates, first_scores, car_make=None, weights=None):
+    """
+    Re-score first-stage candidates. Returns the new scores, aligned with
+    `candidates`.
+    """
+    weights = weights or RERANK_WEIGHTS
+    w = np.array([weights.get(name, 0.0) for name in RERANK_WEIGHTS])
+    return features(state, query, candidates, first_scores, car_make) @ w
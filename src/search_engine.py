@@ -17,15 +17,49 @@ Course: CS410 - Text Information Systems (Fall 2025), UIUC
 """
 
 import os
-import pickle
+import time
+import threading
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import subprocess
 
-from query_normalizer import normalize_query
+from query_normalizer import normalize_query, EXPANSION_MAP
+from search_trace import SearchTrace, NULL_TRACE
+from snippets import compile_query, make_snippet, highlight_ansi
 
 # Path to index files
-from config import INDEX_ROOT, MANUALS_ROOT, CORPUS_ROOT, PROJECT_ROOT
+from config import INDEX_ROOT, MANUALS_ROOT, CORPUS_ROOT, PROJECT_ROOT, TRACE_LOG_PATH
+import index_store
+import query_log
+from index_reader import read_index
+import dense_index
+import related_pages
+from spelling import SpellingIndex
+import reranker
+from reranker import ACTION_KEYWORDS, RERANK_CANDIDATES
+
+
+# How many passages to look at per requested page when collapsing results
+PAGE_OVERFETCH = 4
+
+# Retrieval modes: TF-IDF only, dense (semantic) only, or both fused
+RETRIEVAL_MODES = ("tfidf", "dense", "hybrid")
+DENSE_CANDIDATES = 200
+HYBRID_DENSE_WEIGHT = 0.5
+
+# Related pages shown per result (when related_pages.py has been run)
+RELATED_SHOWN = 3
+
+# Metadata fields with facet counts. A passage counts as a hit (for facets
+# and page_hits) when its first-stage score is above zero, i.e. it
+# matches at least one query term.
+FACET_FIELDS = ("make", "model", "source_pdf")
+
+# In-memory copy of the last loaded index, keyed by the generation stamp.
+# "state" is replaced as a whole on reload, so a caller holding one always
+# sees artifacts from the same build. A pinned cache skips the stat check
+# and keeps serving the loaded state until it is unpinned.
+_index_cache = {"key": None, "state": None, "pinned": False, "mmap": False}
+_index_lock = threading.Lock()
 
 def detect_car_make(query):
     """
@@ -53,10 +87,9 @@ def detect_car_make(query):
 
     # Fallback: try basic model-name detection from metadata (after index loaded)
     try:
-        _, _, metadata = load_index()
-        model_names = { m["model"].lower(): m["make"].lower() for m in metadata }
-        for model, make in model_names.items():
-            if model.lower() in query:
+        state, _ = _load_index_cached()
+        for model, make in state["model_makes"].items():
+            if model in query:
                 return make
     except:
         pass
@@ -65,34 +98,217 @@ def detect_car_make(query):
 
 
 def highlight_terms(text, query):
-    """Bold any words from the query that appear in the text."""
-    query_words = query.lower().split()
-    highlighted = text
-    for w in query_words:
-        if len(w) > 2:  # avoid highlighting "at", "in", etc.
-            highlighted = highlighted.replace(
-                w, f"\033[1m{w}\033[0m"
-            )
-    return highlighted
+    """Bold any whole words from the query that appear in the text."""
+    pattern = compile_query(query)
+    if pattern is None:
+        return text
+    spans = [m.span() for m in pattern.finditer(text)]
+    return highlight_ansi(text, spans)
+
+def index_stamp():
+    """Stat-only fingerprint of the published index generation."""
+    return index_store.generation_stamp(INDEX_ROOT)
+
+
+def _load_index_cached():
+    """
+    Return (state, cache_hit) where state is a dict of the loaded index
+    artifacts. The files are only read again when a new generation is
+    published, e.g. after tfidf_indexer rebuilds them.
+    """
+    if _index_cache["pinned"] and _index_cache["state"] is not None:
+        return _index_cache["state"], True
+
+    key = index_stamp()
+    if _index_cache["key"] == key:
+        return _index_cache["state"], True
+
+    # Concurrent callers (e.g. search_server threads) load only once
+    with _index_lock:
+        if _index_cache["key"] == key:
+            return _index_cache["state"], True
+        state = _read_index(_index_cache["mmap"])
+        # Publish the state before the key so a reader matching the new
+        # key never picks up the previous state
+        _index_cache["state"] = state
+        _index_cache["key"] = key
+        return state, False
+
+
+def _read_index(mmap=False):
+    """Read the published generation (see index_reader.read_index)."""
+    generation, index_dir = index_store.current_index_dir(INDEX_ROOT)
+    return read_index(index_dir, generation, mmap)
+
+
+def clear_index_cache():
+    """Drop the in-memory index so the next load reads from disk."""
+    _index_cache.update(key=None, state=None)
+
+
+def pin_index(mmap=False):
+    """
+    Load the index (memory-mapped if requested) and keep serving it
+    without per-request stat checks until unpin_index() is called.
+    Used by the pre-fork server, where the parent decides when a new
+    index is picked up.
+    """
+    with _index_lock:
+        _index_cache.update(pinned=False, mmap=mmap)
+    clear_index_cache()
+    state, _ = _load_index_cached()
+    _index_cache["pinned"] = True
+    return state
+
+
+def unpin_index():
+    """Return to checking the index files on every load."""
+    _index_cache.update(pinned=False, mmap=False)
+
+
+def current_index():
+    """State dict of the loaded index (artifacts plus its generation name)."""
+    state, _ = _load_index_cached()
+    return state
+
+
+def load_page_ids():
+    """Page id of every passage in the loaded index."""
+    state, _ = _load_index_cached()
+    return state["page_ids"]
+
 
 def load_index():
     """Loads the TF-IDF vectorizer, matrix, and metadata."""
-    with open(os.path.join(INDEX_ROOT, "vectorizer.pkl"), "rb") as f:
-        vectorizer = pickle.load(f)
+    state, _ = _load_index_cached()
+    return state["vectorizer"], state["tfidf_matrix"], state["metadata"]
+
+
+def _doc_freq(state):
+    """Passages per vocabulary term, computed once per loaded index."""
+    if state["doc_freq"] is None:
+        matrix = state["tfidf_matrix"]
+        state["doc_freq"] = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    return state["doc_freq"]
+
+
+def _deleted_rows(state):
+    """
+    Boolean mask of the passages removed since the loaded generation was
+    built (None if there are none). Only the bitmap's stat info is
+    checked per search; the bitmap is re-read when it changes.
+    """
+    stamp = index_store.tombstone_stamp(state["generation"], INDEX_ROOT)
+    cached_stamp, deleted = state["tombstones"]
+    if stamp != cached_stamp:
+        deleted = None
+        if stamp is not None:
+            deleted = index_store.read_tombstones(
+                state["generation"], state["tfidf_matrix"].shape[0], INDEX_ROOT
+            )
+        state["tombstones"] = (stamp, deleted)
+    return deleted
+
+
+def _filter_mask(state, filters):
+    """Passages matching every {field: value} of `filters` (see FACET_FIELDS)."""
+    keep = np.ones(state["tfidf_matrix"].shape[0], dtype=bool)
+    for field, value in filters.items():
+        if field not in FACET_FIELDS:
+            raise ValueError(f"filters must use the fields {', '.join(FACET_FIELDS)}")
+        if not value:
+            continue
+        labels = state["facet_labels"][field]
+        value = value if field == "source_pdf" else value.lower()
+        if value not in labels:
+            keep[:] = False
+            break
+        keep &= state["facet_codes"][field] == labels.index(value)
+    return keep
+
+
+def facet_counts(state, scores, min_score=0.0):
+    """
+    Hits per make, model and source PDF over every passage scoring above
+    `min_score`: {"hits": n, field: [(label, count), ...] most hits first}.
+    """
+    hits = scores > min_score
+    counts = {"hits": int(np.count_nonzero(hits))}
+    for field in FACET_FIELDS:
+        labels = state["facet_labels"][field]
+        per_label = np.bincount(state["facet_codes"][field][hits], minlength=len(labels))
+        found = np.flatnonzero(per_label)
+        found = found[np.argsort(-per_label[found], kind="stable")]
+        counts[field] = [(labels[i], int(per_label[i])) for i in found]
+    return counts
+
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores, best first (partial sort)."""
+    k = min(k, scores.size)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < scores.size:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(scores.size)
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def top_k_pages(scores, page_ids, k, overfetch=PAGE_OVERFETCH):
+    """
+    Best passage from each of the k highest-scoring distinct pages.
 
-    with open(os.path.join(INDEX_ROOT, "tfidf_matrix.pkl"), "rb") as f:
-        tfidf_matrix = pickle.load(f)
+    Over-fetches k * overfetch passages with a partial sort, keeps the
+    first (best) passage per page id, and widens the fetch only if too
+    few distinct pages came back. Returns (indices, passages_per_page).
+    """
+    n = scores.size
+    fetch = min(n, max(k, 1) * overfetch)
 
-    with open(os.path.join(INDEX_ROOT, "metadata.pkl"), "rb") as f:
-        metadata = pickle.load(f)
+    while True:
+        candidates = top_k_indices(scores, fetch)
+        pages = page_ids[candidates]
+        _, first, counts = np.unique(pages, return_index=True, return_counts=True)
+        if first.size >= k or fetch >= n:
+            break
+        fetch = min(n, fetch * overfetch)
 
-    return vectorizer, tfidf_matrix, metadata
+    order = np.argsort(first)[:k]
+    return candidates[first[order]], counts[order]
 
 
-def search(query, top_k=5, car_make=None):
+def search(query, top_k=5, car_make=None, trace=None, collapse_pages=False,
+           retrieval="tfidf", rerank=False, candidates=RERANK_CANDIDATES, raw_query=None,
+           filters=None, facets=None):
     """
     Performs a cosine similarity search against the TF-IDF matrix.
 
+    retrieval="dense" ranks by the dense (semantic) index instead and
+    retrieval="hybrid" adds the dense similarity of the nearest passages
+    to their TF-IDF scores. Both fall back to plain TF-IDF when no dense
+    index has been built for the current generation (see dense_index.py).
+
+    With rerank=True the first-stage scores only pick the best
+    `candidates` passages, which are then re-scored by reranker.py
+    (BM25, phrase, proximity, action-keyword and make features). Lower
+    `candidates` to trade recall for latency.
+
+    With collapse_pages=True, passages from the same manual page are
+    grouped and only the best one is returned, so the top_k results cover
+    top_k distinct pages. Its "page_hits" counts the matching passages of
+    the page across the whole index.
+
+    Pass a SearchTrace as `trace` to record per-stage timings and
+    counters for this request. When the query log is enabled (see
+    query_log.py) the search is logged, with `raw_query` being what the
+    user typed before normalization.
+
+    `filters` ({"make": ..., "model": ..., "source_pdf": ...}) restricts
+    the search to matching passages. Pass a dict as `facets` to have it
+    filled with the hit counts per make, model and source PDF of all
+    passages matching the query (see facet_counts).
+
     Returns:
         A list of metadata dictionaries including:
         - make
@@ -101,49 +317,225 @@ def search(query, top_k=5, car_make=None):
         - page_number
         - score
     """
-    vectorizer, tfidf_matrix, metadata = load_index()
+    trace = trace or NULL_TRACE
+    start = time.perf_counter()
+
+    with trace.stage("load_index"):
+        state, cache_hit = _load_index_cached()
+        vectorizer, tfidf_matrix, metadata = (
+            state["vectorizer"], state["tfidf_matrix"], state["metadata"]
+        )
+    trace.count("index_cache_hit", cache_hit)
+    trace.count("index_generation", state["generation"])
+
+    with trace.stage("vectorize"):
+        # Match the matrix dtype, or scipy upcasts the whole matrix per query
+        query_vec = vectorizer.transform([query]).astype(tfidf_matrix.dtype, copy=False)
+
+    with trace.stage("score"):
+        # Rows and the query vector are L2-normalized by TfidfVectorizer,
+        # so the dot product is the cosine similarity. This avoids
+        # cosine_similarity() re-normalizing (copying) the whole matrix.
+        scores = (tfidf_matrix @ query_vec.T).toarray().ravel()
+        # Table pages (and any indexed diagram pages) count for less
+        if state["weighted"]:
+            scores *= state["passage_weights"]
+
+    if trace.enabled:
+        trace.count("query_terms", int(query_vec.nnz))
+        trace.count("postings_touched", int(_doc_freq(state)[query_vec.indices].sum()))
+        trace.count("candidate_passages", int(np.count_nonzero(scores)))
+
+    if retrieval != "tfidf":
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"retrieval must be one of {', '.join(RETRIEVAL_MODES)}")
+        with trace.stage("dense"):
+            dense = dense_index.load_dense(state["generation"])
+            if dense is not None:
+                ids, sims = dense_index.dense_candidates(dense, query, query_vec, DENSE_CANDIDATES)
+                if retrieval == "dense":
+                    scores = np.zeros_like(scores)
+                    scores[ids] = np.maximum(sims, 0)
+                else:
+                    scores[ids] += HYBRID_DENSE_WEIGHT * np.maximum(sims, 0)
+        trace.count("dense_available", dense is not None)
+        if dense is not None:
+            trace.count("dense_candidates", int(ids.size))
+
+    # Removed manuals stay in the matrix until the next build or compaction
+    deleted = _deleted_rows(state)
+    if deleted is not None:
+        scores[deleted] = -np.inf
+        trace.count("deleted_passages", int(deleted.sum()))
+
+    # Drill-down: only passages of the chosen make / model / manual
+    if filters:
+        with trace.stage("filter"):
+            scores[~_filter_mask(state, filters)] = -np.inf
+
+    # Counted before the make boost, so they show where matches really are
+    if facets is not None:
+        with trace.stage("facets"):
+            facets.update(facet_counts(state, scores))
+
+    # Apply car-make boost BEFORE selecting top-K results. When re-ranking,
+    # it only decides which candidates enter the pool: the reranker has its
+    # own make feature, so the boosted scores are not passed on to it.
+    boosted = scores
+    if car_make:
+        with trace.stage("boost"):
+            code = state["make_index"].get(car_make.lower())
+            if code is not None:
+                boosted = scores.copy() if rerank else scores
+                boosted[state["make_codes"] == code] *= 2
+
+    # Second stage: re-score only the best first-stage candidates
+    pool_ids = None
+    if rerank:
+        with trace.stage("rerank"):
+            _doc_freq(state)
+            pool_ids = top_k_indices(boosted, candidates)
+            pool_ids = pool_ids[scores[pool_ids] > 0]
+            scores = reranker.rerank(state, query, pool_ids, scores[pool_ids], car_make)
+        trace.count("reranked_candidates", int(pool_ids.size))
+
+    with trace.stage("top_k"):
+        page_ids = state["page_ids"] if pool_ids is None else state["page_ids"][pool_ids]
+        if collapse_pages:
+            top_local, _ = top_k_pages(scores, page_ids, top_k)
+            # Over every first-stage match, not just the fetched candidates
+            page_hits = np.bincount(state["page_ids"][boosted > 0])
+        else:
+            top_local, page_hits = top_k_indices(scores, top_k), None
+        top_indices = top_local if pool_ids is None else pool_ids[top_local]
+
+        results = []
+        for rank, idx in enumerate(top_indices):
+            if scores[top_local[rank]] == -np.inf:
+                continue  # removed or filtered out; fewer matches than top_k
+            entry = metadata[idx].copy()
+            entry["score"] = float(scores[top_local[rank]])
+            if page_hits is not None:
+                page = state["page_ids"][idx]
+                entry["page_hits"] = int(page_hits[page]) if page < page_hits.size else 0
+            results.append(entry)
+
+        results = sorted(results, key=lambda x: x["score"], reverse=True)
+
+    if query_log.enabled():
+        options = {"top_k": top_k, "collapse_pages": collapse_pages,
+                   "retrieval": retrieval, "rerank": rerank}
+        if rerank:
+            options["candidates"] = candidates
+        if filters:
+            options["filters"] = filters
+        query_log.log_search(raw_query or query, query, car_make, options, results,
+                             (time.perf_counter() - start) * 1000.0, cache_hit)
+    return results
 
-    query_vec = vectorizer.transform([query])
-    scores = cosine_similarity(query_vec, tfidf_matrix).flatten()
 
-    # Apply car-make boost BEFORE selecting top-K results
-    if car_make:
-        for i, meta in enumerate(metadata):
-            if meta["make"].lower() == car_make.lower():
-                scores[i] *= 2
 
-    top_indices = np.argsort(scores)[::-1][:top_k]
+def _spelling(state):
+    """SpellingIndex over an index's vocabulary, built once per index."""
+    if state.get("spelling") is None:
+        state["spelling"] = SpellingIndex.from_vectorizer(state["vectorizer"], _doc_freq(state))
+    return state["spelling"]
+
+
+def spelling_index():
+    """SpellingIndex over the loaded index vocabulary, built once per index."""
+    state, _ = _load_index_cached()
+    return _spelling(state)
+
+
+def correct_query(query):
+    """
+    Fix words that are not in the index vocabulary ("transmision" ->
+    "transmission"), for a "did you mean" suggestion. Make and model
+    names (spelling.KNOWN_NAMES and those of the index), capitalized
+    words and the phrases the query normalizer expands are never
+    changed. Returns (corrected_query, {word: correction}).
+    """
+    state, _ = _load_index_cached()
+    keep = set(state["make_index"]) | {w for model in state["model_makes"] for w in model.split()}
+    keep.update(w for key in EXPANSION_MAP for w in key.split())
+    try:
+        keep.update(d.lower() for d in os.listdir(MANUALS_ROOT))
+    except OSError:
+        pass
+    return spelling_index().correct_query(query, keep)
+
 
+def suggest_completions(text, n=5):
+    """Vocabulary completions of the last (partly typed) word of `text`."""
+    words = text.split()
+    if not words or text[-1:].isspace() or len(words[-1]) < 2:
+        return []
+    last = words[-1].lower()
+    return [t for t in spelling_index().complete(last, n + 1) if t != last][:n]
+
+
+def _doc_rows(state):
+    """Row of every doc_id in the loaded index, built once per index."""
+    if state.get("doc_rows") is None:
+        state["doc_rows"] = {m["doc_id"]: i for i, m in enumerate(state["metadata"])}
+    return state["doc_rows"]
+
+
+def warm_index(state):
+    """
+    Build everything otherwise computed on the first search that needs it
+    (term document frequencies, spelling index, doc_id rows, mean passage
+    length). The pre-fork server does this in the parent, so the workers
+    share one copy instead of each building its own.
+    """
+    _doc_freq(state)
+    _spelling(state)
+    _doc_rows(state)
+    reranker._avg_doc_len(state)
+    return state
+
+
+def more_like_this(doc_id, n=RELATED_SHOWN):
+    """
+    Pages related to the page of a result (precomputed by
+    related_pages.py), best first, as metadata dicts with a "score".
+    Nothing is scored here; an empty list means no lists were built.
+    """
+    state, _ = _load_index_cached()
+    related = related_pages.load_related(state["generation"])
+    row = _doc_rows(state).get(doc_id)
+    if related is None or row is None:
+        return []
+
+    rows, scores = related_pages.neighbors(related, state["page_ids"][row])
+    deleted = _deleted_rows(state)
     results = []
-    for idx in top_indices:
-        entry = metadata[idx].copy()
-        entry["score"] = float(scores[idx])
+    for idx, score in zip(rows, scores):
+        if deleted is not None and deleted[idx]:
+            continue
+        entry = state["metadata"][idx].copy()
+        entry["score"] = float(score)
         results.append(entry)
-
-    results = sorted(results, key=lambda x: x["score"], reverse=True)
+        if len(results) == n:
+            break
     return results
 
 
-
 def pretty_print(results, query=None):
     for i, r in enumerate(results, start=1):
         text = r.get("text", "")
         lower_text = text.lower()
 
-        excerpt_raw = text[:250].replace("\n", " ") + ("..." if len(text) > 250 else "")
-
-        # Highlight query terms
-        if query:
-            excerpt = highlight_terms(excerpt_raw.lower(), query)
-        else:
-            excerpt = excerpt_raw
+        # Excerpt around the best-matching part of the passage
+        excerpt, spans = make_snippet(text, query, width=250)
+        excerpt = highlight_ansi(excerpt, spans)
 
         print(f"\n=== Recommended Check / Likely Cause {i} ===")
         print(f"doc_id:      {r['doc_id']}")   # <-- ADDED LINE
 
         # Optional helpful flag
-        action_keywords = ["check", "inspect", "replace", "adjust", "diagnose", "verify"]
-        if any(kw in lower_text for kw in action_keywords):
+        if any(kw in lower_text for kw in ACTION_KEYWORDS):
             print("This passage includes actionable steps.")
 
         print(f"Score:       {r['score']:.4f}")
@@ -151,8 +543,14 @@ def pretty_print(results, query=None):
         print(f"Model:       {r['model']}")
         print(f"Manual:      {r['source_pdf']}")
         print(f"Page:        {r['page_number']}")
+        if r.get("page_hits", 1) > 1:
+            print(f"Matches:     {r['page_hits']} passages on this page")
         print(f"Excerpt:     {excerpt}")
 
+        for rel in more_like_this(r["doc_id"]):
+            print(f"Related:     {rel['make']} {rel['model']} - {rel['source_pdf']}, "
+                  f"page {rel['page_number']} ({rel['score']:.2f})")
+
 
 def find_pdf_recursive(make, pdf_name):
     """Search for a PDF anywhere under data/manuals/."""
@@ -181,24 +579,42 @@ def main():
     print("Type 'quit' to exit.")
     print()
 
+    query_log.set_source("cli")
+
+    # Load the index while the user types the first question
+    threading.Thread(target=load_index, daemon=True).start()
+
     while True:
         query = input("Enter your question: ")
         if query.lower().strip() == "quit":
             break
 
+        # Per-stage timings are only collected when a trace log is configured
+        trace = SearchTrace(query) if TRACE_LOG_PATH else NULL_TRACE
+
         # Auto-detect make
-        detected_make = detect_car_make(query)
+        with trace.stage("detect_car_make"):
+            detected_make = detect_car_make(query)
         if detected_make:
             print(f"\nDetected manufacturer: {detected_make.capitalize()} (boosting relevant results)")
         else:
             print("\nNo manufacturer detected in query.")
 
-        normalized_query = normalize_query(query)
+        # Corrections are only suggested; the query is searched as typed
+        with trace.stage("correct_spelling"):
+            corrected, corrections = correct_query(query)
+        if corrections:
+            print(f"\nDid you mean: {corrected}")
+
+        with trace.stage("normalize_query"):
+            normalized_query = normalize_query(query)
         if normalized_query != query.lower():
             print(f"\nNormalized query: {normalized_query}")
 
 
-        results = search(normalized_query, top_k=5, car_make=detected_make)
+        results = search(normalized_query, top_k=5, car_make=detected_make,
+                         trace=trace, collapse_pages=True, rerank=True, raw_query=query)
+        trace.log()
         pretty_print(results, query=normalized_query)
 
 
@@ -0,0 +1,452 @@
+"""
+Filename: search_server.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Standalone local HTTP/JSON search service. Loads the TF-IDF index
+    once at startup and keeps it warm in memory, then answers requests
+    concurrently from a fixed-size thread pool, so shop terminals and
+    scripts can share one process instead of each reloading the index.
+
+    Endpoints (GET with query-string parameters, or POST with a JSON body):
+
+        /search       q, k=5, make=auto|none|<make>, collapse=1, normalize=1,
+                      spell=0, rerank=1, candidates=300, trace=0,
+                      facets=0, filter_make, filter_model, filter_pdf
+        /normalize    q
+        /suggest      q, n=5   (completions of the last word being typed)
+        /detect_make  q
+        /health
+
+    With --processes N (POSIX only) the server runs in pre-fork mode: the
+    parent loads the index once, memory-mapping the matrix and per-passage
+    arrays, freezes its objects out of the garbage collector, and forks N
+    workers that share those pages copy-on-write and accept connections on
+    the same listening socket. The passage metadata stays a list of dicts
+    (see index_reader), so reading it copies its pages into each worker. Hot swap: the parent polls the published index
+    generation (or reacts to SIGHUP), and once a new one is published it
+    loads it, forks a fresh set of workers on it and tells the old workers to
+    finish their in-flight requests and exit. The listening socket stays
+    open throughout, so clients never see the switch.
+
+    Usage:
+        python src/search_server.py --port 8410 --threads 8
+        python src/search_server.py --port 8410 --processes 4 --threads 4
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from search_engine import (
+    search, detect_car_make, load_index, current_index, pin_index, index_stamp,
+    correct_query, suggest_completions, warm_index
+)
+from query_normalizer import normalize_query
+from search_trace import SearchTrace, NULL_TRACE
+from reranker import RERANK_CANDIDATES
+import query_log
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8410
+DEFAULT_THREADS = 8
+RELOAD_POLL_SECONDS = 5.0
+MAX_TOP_K = 100
+MAX_CANDIDATES = 5000
+MAX_BODY_BYTES = 64 * 1024
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """HTTPServer that hands each connection to a bounded worker pool."""
+
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, threads=DEFAULT_THREADS):
+        super().__init__(server_address, handler_class)
+        self.threads = threads
+        self.pool = None  # created on first request, i.e. after any fork
+
+    def process_request(self, request, client_address):
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="search")
+        self.pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+
+
+def _flag(value, default):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _int_param(params, name, default, lo, hi):
+    """
+    Integer parameter clamped to [lo, hi], `default` when missing or null;
+    ValueError (-> 400) if not a number.
+    """
+    value = params.get(name)
+    if value is None:
+        value = default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"parameter '{name}' must be an integer, got {value!r}")
+    return max(lo, min(value, hi))
+
+
+def _str_param(params, name, default=""):
+    """String parameter, `default` when missing or null; ValueError (-> 400) otherwise."""
+    value = params.get(name)
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise ValueError(f"parameter '{name}' must be a string, got {value!r}")
+    return value
+
+
+def _query_param(params):
+    return (_str_param(params, "q") or _str_param(params, "query")).strip()
+
+
+def handle_search(params):
+    query = _query_param(params)
+    if not query:
+        raise ValueError("missing query parameter 'q'")
+
+    top_k = _int_param(params, "k" if "k" in params else "top_k", 5, 1, MAX_TOP_K)
+    make = (_str_param(params, "make") or "auto").strip().lower()
+    want_trace = _flag(params.get("trace"), False)
+    trace = SearchTrace(query) if want_trace else NULL_TRACE
+
+    # Spelling corrections come back as "did_you_mean"; spell=1 also
+    # searches for the corrected query instead of the one typed
+    with trace.stage("correct_spelling"):
+        corrected, corrections = correct_query(query)
+    searched = corrected if _flag(params.get("spell"), False) else query
+
+    normalized = searched.lower()
+    if _flag(params.get("normalize"), True):
+        with trace.stage("normalize_query"):
+            normalized = normalize_query(searched)
+
+    if make == "auto":
+        with trace.stage("detect_car_make"):
+            car_make = detect_car_make(normalized)
+    elif make in ("", "none"):
+        car_make = None
+    else:
+        car_make = make
+
+    candidates = _int_param(params, "candidates", RERANK_CANDIDATES, top_k, MAX_CANDIDATES)
+    filters = {field: _str_param(params, f"filter_{name}")
+               for field, name in (("make", "make"), ("model", "model"), ("source_pdf", "pdf"))}
+    filters = {field: value for field, value in filters.items() if value}
+    facets = {} if _flag(params.get("facets"), False) else None
+    results = search(normalized, top_k=top_k, car_make=car_make, trace=trace,
+                     collapse_pages=_flag(params.get("collapse"), True),
+                     rerank=_flag(params.get("rerank"), True), candidates=candidates,
+                     raw_query=query, filters=filters, facets=facets)
+
+    response = {
+        "query": query,
+        "corrections": corrections,
+        "did_you_mean": corrected if corrections else None,
+        "normalized": normalized,
+        "car_make": car_make,
+        "results": results,
+    }
+    if facets is not None:
+        response["facets"] = facets
+    trace.log()
+    if want_trace:
+        response["timings"] = trace.to_dict()
+    return response
+
+
+def handle_normalize(params):
+    query = _query_param(params)
+    if not query:
+        raise ValueError("missing query parameter 'q'")
+    return {"query": query, "normalized": normalize_query(query)}
+
+
+def handle_suggest(params):
+    text = _str_param(params, "q") or _str_param(params, "query")
+    n = _int_param(params, "n", 5, 1, MAX_TOP_K)
+    return {"query": text, "completions": suggest_completions(text, n)}
+
+
+def handle_detect_make(params):
+    query = _query_param(params)
+    if not query:
+        raise ValueError("missing query parameter 'q'")
+    return {"query": query, "car_make": detect_car_make(query)}
+
+
+def handle_health(params):
+    state = current_index()
+    return {
+        "status": "ok",
+        "generation": state["generation"],
+        "passages": int(state["tfidf_matrix"].shape[0]),
+    }
+
+
+ROUTES = {
+    "/search": handle_search,
+    "/normalize": handle_normalize,
+    "/suggest": handle_suggest,
+    "/detect_make": handle_detect_make,
+    "/health": handle_health,
+}
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    server_version = "AutoAssist/1.0"
+    protocol_version = "HTTP/1.1"
+    timeout = 15  # seconds an idle keep-alive connection may hold a worker
+    quiet = False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self._dispatch(url.path, params)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self._send(413, {"error": "request body too large"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": "body must be JSON"})
+            return
+        if not isinstance(body, dict):
+            self._send(400, {"error": "body must be a JSON object"})
+            return
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        params.update(body)
+        self._dispatch(url.path, params)
+
+    def _dispatch(self, path, params):
+        handler = ROUTES.get(path.rstrip("/") or "/")
+        if handler is None:
+            self._send(404, {"error": f"unknown endpoint {path}"})
+            return
+        try:
+            self._send(200, handler(params))
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _send(self, status, payload):
+        data = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+# Pre-fork serving
+
+def _run_worker(server):
+    """Body of a forked worker: serve until SIGTERM, then drain and exit."""
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so call it elsewhere
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    status = 0
+    try:
+        server.serve_forever()
+        if server.pool is not None:
+            server.pool.shutdown(wait=True)  # finish in-flight requests
+    except Exception:
+        status = 1
+    finally:
+        # os._exit skips atexit handlers, so write out queued log entries here
+        query_log.flush()
+        os._exit(status)
+
+
+def _load_shared_index():
+    """Load (memory-mapped) and freeze the index in the parent before forking."""
+    gc.unfreeze()
+    state = warm_index(pin_index(mmap=True))
+    # Move everything loaded so far into the permanent generation, so
+    # collections in the workers never write to these objects' pages.
+    gc.collect()
+    gc.freeze()
+    return state
+
+
+def _spawn_workers(server, count):
+    pids = []
+    for _ in range(count):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(server)
+        pids.append(pid)
+    return pids
+
+
+def _stop_workers(pids):
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def serve_prefork(server, processes, poll_seconds=RELOAD_POLL_SECONDS):
+    """Parent loop of pre-fork mode: supervise workers and hot-swap the index."""
+    if not hasattr(os, "fork"):
+        raise SystemExit("--processes needs a platform with os.fork (Linux/macOS).")
+
+    stamp = index_stamp()
+    state = _load_shared_index()
+    print(f"Index generation {state['generation']}: {state['tfidf_matrix'].shape[0]} passages.")
+
+    workers = set(_spawn_workers(server, processes))
+    retiring = set()
+    events = {"reload": False, "stop": False}
+
+    def on_hup(signum, frame):
+        events["reload"] = True
+
+    def on_stop(signum, frame):
+        events["stop"] = True
+
+    signal.signal(signal.SIGHUP, on_hup)
+    signal.signal(signal.SIGTERM, on_stop)
+    signal.signal(signal.SIGINT, on_stop)
+
+    last_poll = time.monotonic()
+
+    while not events["stop"]:
+        time.sleep(0.2)
+
+        # Reap exited workers; replace current ones that died unexpectedly
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if not pid:
+                break
+            if pid in retiring:
+                retiring.discard(pid)
+            elif pid in workers:
+                workers.discard(pid)
+                print(f"Worker {pid} exited; starting a replacement.")
+                workers.update(_spawn_workers(server, 1))
+
+        if time.monotonic() - last_poll < poll_seconds and not events["reload"]:
+            continue
+        last_poll = time.monotonic()
+
+        # Generations are published atomically, so a changed stamp always
+        # points at a complete index
+        current = index_stamp()
+        if current == stamp and not events["reload"]:
+            continue
+        events["reload"] = False
+
+        try:
+            state = _load_shared_index()
+        except Exception as e:
+            print(f"Index reload failed, workers keep the previous generation: {e}")
+            continue
+
+        stamp = current
+        print(f"Index generation {state['generation']}: {state['tfidf_matrix'].shape[0]} passages.")
+
+        old = workers
+        workers = set(_spawn_workers(server, processes))
+        _stop_workers(old)
+        retiring |= old
+
+    _stop_workers(workers | retiring)
+    for pid in workers | retiring:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    server.socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve AutoAssist search over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help="Worker threads answering requests")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="Pre-fork this many worker processes sharing one index")
+    parser.add_argument("--reload-poll", type=float, default=RELOAD_POLL_SECONDS,
+                        help="Seconds between index checks in pre-fork mode")
+    parser.add_argument("--quiet", action="store_true", help="Do not log every request")
+    args = parser.parse_args()
+
+    SearchRequestHandler.quiet = args.quiet
+    query_log.set_source("server")
+    server = ThreadPoolHTTPServer((args.host, args.port), SearchRequestHandler, args.threads)
+
+    if args.processes > 0:
+        print(f"AutoAssist search server on http://{args.host}:{args.port} "
+              f"({args.processes} processes x {args.threads} threads). Press Ctrl+C to stop.")
+        sys.stdout.flush()
+        serve_prefork(server, args.processes, args.reload_poll)
+        return
+
+    print("Loading index...")
+    _, tfidf_matrix, _ = load_index()
+    print(f"Index ready: {tfidf_matrix.shape[0]} passages.")
+
+    print(f"AutoAssist search server on http://{args.host}:{args.port} "
+          f"({args.threads} threads). Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
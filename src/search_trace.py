@@ -0,0 +1,94 @@
+"""
+Filename: search_trace.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Lightweight per-request instrumentation for the search pipeline.
+    A SearchTrace records how long each stage took (normalize_query,
+    detect_car_make, load_index, vectorize, score, boost, top_k,
+    find_pdf_recursive, ...) together with counters such as candidate
+    passages, postings touched and index cache hits.
+
+    Pass a SearchTrace into search() to collect timings, or leave the
+    argument out to get NULL_TRACE, whose methods do nothing so the
+    instrumentation costs close to nothing when disabled. Finished
+    traces can be appended to a JSON-lines log (see TRACE_LOG_PATH
+    in config.py).
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+from config import TRACE_LOG_PATH
+
+_log_lock = threading.Lock()
+
+
+class SearchTrace:
+    """Collects stage timings (ms) and counters for one search request."""
+
+    enabled = True
+
+    def __init__(self, query=None):
+        self.query = query
+        self.stages = {}
+        self.counters = {}
+        self._start = time.perf_counter()
+        self._started_at = time.time()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block; repeated stages accumulate."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000.0
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def count(self, name, value):
+        self.counters[name] = value
+
+    def total_ms(self):
+        return (time.perf_counter() - self._start) * 1000.0
+
+    def to_dict(self):
+        return {
+            "timestamp": self._started_at,
+            "query": self.query,
+            "total_ms": round(self.total_ms(), 3),
+            "stages_ms": {k: round(v, 3) for k, v in self.stages.items()},
+            "counters": self.counters,
+        }
+
+    def log(self, path=TRACE_LOG_PATH):
+        """Append this trace as one JSON line. No-op when no log path is set."""
+        if not path:
+            return
+        line = json.dumps(self.to_dict(), default=str)
+        with _log_lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class _NullTrace:
+    """Stand-in used when tracing is off. Every call is a no-op."""
+
+    enabled = False
+    _null = nullcontext()
+
+    def stage(self, name):
+        return self._null
+
+    def count(self, name, value):
+        pass
+
+    def log(self, path=TRACE_LOG_PATH):
+        pass
+
+
+NULL_TRACE = _NullTrace()
@@ -4,7 +4,9 @@ Project: AutoAssist - Vehicle Maintenance Question Answering Tool
 Description:
     Converts extracted raw text into semantically meaningful
     passages using sentence tokenization. Outputs JSONL records
-    containing metadata needed by the TF-IDF indexer.
+    containing metadata needed by the TF-IDF indexer. Table pages are
+    kept as one passage and wiring-diagram pages are skipped
+    (see page_classifier.py).
 
 Author: Kunal Sinha
 Course: CS410 - Text Information Systems (Fall 2025), UIUC
@@ -17,6 +19,7 @@ from tqdm import tqdm
 from pathlib import Path
 
 from config import CORPUS_ROOT
+from page_classifier import classify_page, PAGE_SEGMENTATION
 ROOT = CORPUS_ROOT
 
 def segment_text(text, min_len=40):
@@ -35,37 +38,91 @@ def segment_text(text, min_len=40):
 
     return passages
 
-def build_passages(make, model):
-    raw_dir = os.path.join(ROOT, make, "raw_text")
-    out_dir = os.path.join(ROOT, make, "passages")
-    os.makedirs(out_dir, exist_ok=True)
-
-    out_json = os.path.join(out_dir, f"{make}_passages.jsonl")
-    jf = open(out_json, "w", encoding="utf-8")
-
-    for fname in tqdm(os.listdir(raw_dir), desc=f"{make} passages"):
-        if not fname.endswith(".txt"): continue
-
-        pdf_stem = fname.rsplit("_page", 1)[0]
-        page_num = fname.rsplit("_page", 1)[1].replace(".txt", "")
-
-        text = open(os.path.join(raw_dir, fname), encoding="utf-8").read()
-        passages = segment_text(text)
+def page_records(make, model, pdf_stem, pages, classify=True):
+    """
+    Yield passage records for the (page_number, text) pairs of one PDF.
+    `pages` can be any iterable, e.g. pages streamed out of the extractor.
+    Each page is classified first (see page_classifier.py) and segmented,
+    kept whole or skipped according to its type.
+    """
+    for page_num, text in pages:
+        page_type = classify_page(text) if classify else "prose"
+        mode = PAGE_SEGMENTATION[page_type]
+        if mode == "skip":
+            continue
+        if mode == "sentences":
+            passages = segment_text(text)
+        else:
+            passages = [text.strip()] if text.strip() else []
 
         for i, p in enumerate(passages):
-            obj = {
+            yield {
                 "doc_id": f"{make}_{pdf_stem}_p{page_num}_{i}",
                 "make": make,
                 "model": model,
                 "source_pdf": f"{pdf_stem}.pdf",
                 "page_number": int(page_num),
                 "passage_index": i,
+                "page_type": page_type,
                 "text": p
             }
-            jf.write(json.dumps(obj) + "\n")
 
-    jf.close()
-    print(f"Saved → {out_json}")
+def passages_path(make):
+    return os.path.join(ROOT, make, "passages", f"{make}_passages.jsonl")
+
+def write_passages(make, records, replace_sources=()):
+    """
+    Add streamed passage records to the make's JSONL file, dropping any
+    earlier passages of the PDFs named in replace_sources. Existing lines
+    are copied one at a time into a temporary file that replaces the old
+    one at the end, so memory stays bounded and a failure mid-way leaves
+    the previous file untouched. Returns the number of records written.
+    """
+    out_json = passages_path(make)
+    os.makedirs(os.path.dirname(out_json), exist_ok=True)
+    replace_sources = set(replace_sources)
+    tmp = f"{out_json}.tmp-{os.getpid()}"
+
+    count = 0
+    try:
+        with open(tmp, "w", encoding="utf-8") as jf:
+            if os.path.exists(out_json):
+                with open(out_json, "r", encoding="utf-8") as old:
+                    for line in old:
+                        if replace_sources and json.loads(line).get("source_pdf") in replace_sources:
+                            continue
+                        jf.write(line)
+            for obj in records:
+                jf.write(json.dumps(obj) + "\n")
+                count += 1
+        os.replace(tmp, out_json)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return count
+
+def build_passages(make, model):
+    """
+    Regenerate the passages of every PDF that has per-page text files
+    under raw_text/. Passages of other PDFs (e.g. manuals added with
+    add_manual.py, which never writes raw_text/) are kept.
+    """
+    raw_dir = os.path.join(ROOT, make, "raw_text")
+    fnames = sorted(f for f in os.listdir(raw_dir) if f.endswith(".txt"))
+    sources = {f"{fname.rsplit('_page', 1)[0]}.pdf" for fname in fnames}
+
+    def records():
+        for fname in tqdm(fnames, desc=f"{make} passages"):
+            pdf_stem = fname.rsplit("_page", 1)[0]
+            page_num = fname.rsplit("_page", 1)[1].replace(".txt", "")
+
+            with open(os.path.join(raw_dir, fname), encoding="utf-8") as f:
+                text = f.read()
+
+            yield from page_records(make, model, pdf_stem, [(page_num, text)])
+
+    write_passages(make, records(), replace_sources=sources)
+    print(f"Saved → {passages_path(make)}")
 
 def main():
     build_passages("mitsubishi", "Eclipse 2003-2005")
@@ -0,0 +1,151 @@
+"""
+Filename: snippets.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Query-biased snippet generation and term highlighting shared by
+    the CLI and the Streamlit UI.
+
+    The query is tokenized once into a single compiled, word-bounded
+    regex. One pass of that regex over a passage gives the offsets of
+    every matching term; a sliding window over those offsets picks the
+    excerpt that covers the most distinct query terms, and the match
+    offsets inside it are returned as highlight spans. Work per result
+    is one regex scan plus a linear pass over the matches, however many
+    terms the expanded query contains.
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import re
+from functools import lru_cache
+
+# Short function words that would otherwise light up every excerpt
+STOP_TERMS = {
+    "and", "the", "for", "with", "not", "but", "are", "was", "has", "have",
+    "does", "this", "that", "from", "when", "into", "like", "need", "feels",
+}
+
+# Passages are short, but never scan more than this many characters
+MAX_SCAN_CHARS = 20000
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def query_terms(query, min_len=3):
+    """Unique lowercase query words worth highlighting, longest first."""
+    terms = {
+        t for t in _TOKEN_RE.findall(query.lower())
+        if len(t) >= min_len and t not in STOP_TERMS
+    }
+    return sorted(terms, key=lambda t: (-len(t), t))
+
+
+@lru_cache(maxsize=256)
+def compile_query(query):
+    """
+    One case-insensitive regex matching any query term as a whole word
+    (plus a plural s/es). Returns None when nothing is worth matching.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return None
+    alternation = "|".join(re.escape(t) for t in terms)
+    return re.compile(rf"\b(?:{alternation})(?:e?s)?\b", re.IGNORECASE)
+
+
+def _term_of(match_text):
+    """Fold plural forms so 'pads' and 'pad' count as the same term."""
+    t = match_text.lower()
+    return t[:-1] if t.endswith("s") else t
+
+
+def best_window(text, pattern, width=250):
+    """
+    Return (start, end) of the width-sized window of `text` that covers
+    the most distinct query terms (ties broken by total matches, then by
+    earliest position).
+    """
+    if len(text) <= width or pattern is None:
+        return 0, min(len(text), width)
+
+    matches = [(m.start(), m.end(), _term_of(m.group()))
+               for m in pattern.finditer(text, 0, MAX_SCAN_CHARS)]
+    if not matches:
+        return 0, width
+
+    counts = {}
+    left = 0
+    best = (0, 0, 0)  # (distinct, total, -left)
+    best_left = 0
+
+    for right, (_, end, term) in enumerate(matches):
+        counts[term] = counts.get(term, 0) + 1
+        while end - matches[left][0] > width:
+            old = matches[left][2]
+            counts[old] -= 1
+            if not counts[old]:
+                del counts[old]
+            left += 1
+        score = (len(counts), right - left + 1, -left)
+        if score > best:
+            best, best_left = score, left
+
+    # Lead in with a little context before the first matched term
+    start = max(0, matches[best_left][0] - width // 5)
+    if start:
+        space = text.rfind(" ", 0, start + 1)
+        start = space + 1 if space > start - 20 else start
+    start = min(start, len(text) - width)
+    return start, start + width
+
+
+def make_snippet(text, query=None, width=250):
+    """
+    Build a single-line excerpt of `text` for `query`.
+
+    Returns (excerpt, spans) where spans are (start, end) offsets of
+    query-term matches inside the excerpt, ready for highlighting.
+    """
+    pattern = compile_query(query) if query else None
+    start, end = best_window(text, pattern, width)
+
+    body = text[start:end].replace("\n", " ")
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if end < len(text) else ""
+    excerpt = prefix + body + suffix
+
+    spans = []
+    if pattern is not None:
+        shift = len(prefix)
+        spans = [(m.start() + shift, m.end() + shift) for m in pattern.finditer(body)]
+
+    return excerpt, spans
+
+
+def apply_highlights(excerpt, spans, open_tag, close_tag, escape=None):
+    """Wrap every span in open/close tags, optionally escaping the rest."""
+    escape = escape or (lambda s: s)
+    out = []
+    pos = 0
+    for s, e in spans:
+        out.append(escape(excerpt[pos:s]))
+        out.append(open_tag + escape(excerpt[s:e]) + close_tag)
+        pos = e
+    out.append(escape(excerpt[pos:]))
+    return "".join(out)
+
+
+def highlight_ansi(excerpt, spans):
+    """Bold spans for terminal output."""
+    return apply_highlights(excerpt, spans, "\033[1m", "\033[0m")
+
+
+_MD_SPECIAL = re.compile(r"([\\`*_{}\[\]<>#|~$])")
+
+
+def highlight_markdown(excerpt, spans):
+    """Bold spans for Streamlit markdown, escaping markdown syntax in the text."""
+    return apply_highlights(
+        excerpt, spans, "**", "**", escape=lambda s: _MD_SPECIAL.sub(r"\\\1", s)
+    )
@@ -0,0 +1,234 @@
+"""
+Filename: spelling.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Vocabulary-backed spelling correction and type-ahead completion.
+
+    A misspelled word such as "transmision" or "alternater" is not in the
+    TF-IDF vocabulary, so it drops out of the query vector and the search
+    ranks on whatever is left. SpellingIndex maps such words back onto
+    index terms:
+
+        - correction uses symmetric delete (SymSpell): every term is
+          stored under all strings reachable by deleting up to
+          MAX_EDIT_DISTANCE characters from its first PREFIX_LENGTH
+          characters. A query word generates its own deletes the same
+          way, and the few terms sharing one of them are checked with a
+          real edit distance. Lookups touch a handful of dict entries,
+          not the vocabulary, and take microseconds.
+        - completion binary-searches a sorted term array for the range
+          starting with the typed prefix and returns the terms of that
+          range with the highest document frequency.
+
+    Both are built once per loaded index from the vectorizer's single-word
+    vocabulary and the passage document frequencies (see
+    search_engine.spelling_index).
+
+    Correction is deliberately conservative, since a wrong rewrite is worse
+    than a missed typo. A word is left alone when it is a known make or
+    model name (KNOWN_NAMES), capitalized in the query, shorter than
+    MIN_CORRECT_LENGTH, or an inflection of a vocabulary term ("needs",
+    "diagrams"). A correction must also be used in CORRECTION_MIN_DF
+    passages and be CORRECTION_DF_MARGIN times more frequent than any
+    other term at the same distance. Callers offer the result as a "did
+    you mean" suggestion rather than searching for it.
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import re
+import bisect
+import numpy as np
+
+MAX_EDIT_DISTANCE = 2
+
+# Only the start of a term is expanded into deletes, which bounds the
+# index size; longer words are still compared in full
+PREFIX_LENGTH = 7
+
+# Words shorter than this are never corrected (codes, units, abbreviations,
+# and short words that are one edit away from too many others)
+MIN_CORRECT_LENGTH = 5
+
+# Words up to this length may be off by one edit only
+SHORT_WORD_LENGTH = 7
+
+# A correction must appear in this many passages, and be this many times
+# more frequent than the runner-up at the same edit distance
+CORRECTION_MIN_DF = 3
+CORRECTION_DF_MARGIN = 2.0
+
+# Makes and models that are never corrected, whether or not the loaded
+# index has manuals for them
+KNOWN_NAMES = frozenset("""
+    acura audi bmw buick cadillac chevrolet chevy chrysler dodge fiat ford gmc
+    honda hyundai infiniti jaguar jeep kia lexus lincoln mazda mercedes mini
+    mitsubishi nissan pontiac porsche saturn scion subaru suzuki tesla toyota
+    volkswagen volvo
+    accord altima avalon camaro camry civic corolla corvette crv eclipse
+    elantra explorer forester fusion galant highlander impreza jetta lancer
+    legacy malibu maxima miata mustang odyssey outback outlander passat pilot
+    prius rav4 sentra sienna silverado sonata tacoma tundra wrangler
+""".split())
+
+# Suffixes tried when checking whether a word is an inflection of a term
+_SUFFIXES = ("s", "es", "ed", "d", "ing", "er")
+
+_WORD_RE = re.compile(r"\b\w\w+\b")
+
+
+def _deletes(word, max_distance):
+    """Every string obtained by deleting up to max_distance characters."""
+    found = {word}
+    frontier = [word]
+    for _ in range(max_distance):
+        next_frontier = []
+        for w in frontier:
+            if len(w) <= 1:
+                continue
+            for i in range(len(w)):
+                d = w[:i] + w[i + 1:]
+                if d not in found:
+                    found.add(d)
+                    next_frontier.append(d)
+        frontier = next_frontier
+    return found
+
+
+def _inflections(word):
+    """The word's likely base forms and their inflected forms."""
+    bases = {word}
+    if word.endswith("ies"):
+        bases.add(word[:-3] + "y")
+    for suffix in ("s", "es", "ed", "d", "ing"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            bases.add(word[:-len(suffix)])
+            if suffix == "ing":
+                bases.add(word[:-3] + "e")
+    return bases | {base + suffix for base in bases for suffix in _SUFFIXES}
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance (insert, delete, substitute, swap
+    adjacent), or limit + 1 as soon as it must exceed `limit`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if (prev2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class SpellingIndex:
+    """Symmetric-delete correction and prefix completion over index terms."""
+
+    def __init__(self, terms, doc_freq, stop_words=(),
+                 max_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.stop_words = frozenset(stop_words)
+        self.doc_freq = dict(zip(terms, (int(df) for df in doc_freq)))
+
+        # Correction only ever suggests real words
+        self.deletes = {}
+        for term in terms:
+            if term.isalpha() and len(term) >= MIN_CORRECT_LENGTH - max_distance:
+                for d in _deletes(term[:prefix_length], max_distance):
+                    self.deletes.setdefault(d, []).append(term)
+
+        order = sorted(range(len(terms)), key=terms.__getitem__)
+        self.sorted_terms = [terms[i] for i in order]
+        self.sorted_df = np.asarray(doc_freq, dtype=np.int64)[order]
+
+    @classmethod
+    def from_vectorizer(cls, vectorizer, doc_freq):
+        """Index the single-word terms of a fitted (Query)Vectorizer."""
+        terms, columns = [], []
+        for term, col in vectorizer.vocabulary_.items():
+            if " " not in term:
+                terms.append(term)
+                columns.append(col)
+        return cls(terms, np.asarray(doc_freq)[columns], vectorizer.get_stop_words() or ())
+
+    def correct(self, word):
+        """
+        Vocabulary term `word` is a typo of, or the word itself if it is
+        known, protected, an inflection of a term, or not clearly a typo.
+        """
+        word = word.lower()
+        if (word in self.doc_freq or word in self.stop_words or word in KNOWN_NAMES
+                or len(word) < MIN_CORRECT_LENGTH or not word.isalpha()):
+            return word
+        if any(form in self.doc_freq for form in _inflections(word)):
+            return word
+
+        limit = 1 if len(word) <= SHORT_WORD_LENGTH else self.max_distance
+        found = set()
+        for d in _deletes(word[:self.prefix_length], limit):
+            found.update(self.deletes.get(d, ()))
+        candidates = []
+        for term in found:
+            distance = edit_distance(word, term, limit)
+            if distance <= limit:
+                candidates.append((distance, -self.doc_freq[term], term))
+        if not candidates:
+            return word
+
+        candidates.sort()
+        distance, best_df, best = candidates[0][0], -candidates[0][1], candidates[0][2]
+        if best_df < CORRECTION_MIN_DF:
+            return word
+        if (len(candidates) > 1 and candidates[1][0] == distance
+                and best_df < CORRECTION_DF_MARGIN * -candidates[1][1]):
+            return word  # ambiguous: two terms fit about equally well
+        return best
+
+    def correct_query(self, query, keep=()):
+        """
+        Query with unknown words replaced by their corrections, and a dict
+        {original: correction} of what changed. Capitalized words (likely
+        names) and words in `keep` (e.g. make and model names of the
+        index) are left alone.
+        """
+        corrections = {}
+
+        def fix(match):
+            word = match.group(0)
+            if word[0].isupper() or word.lower() in keep:
+                return word
+            fixed = self.correct(word)
+            if fixed != word.lower():
+                corrections[word] = fixed
+                return fixed
+            return word
+
+        corrected = _WORD_RE.sub(fix, query)
+        return corrected, corrections
+
+    def complete(self, prefix, n=8):
+        """Up to n vocabulary terms starting with `prefix`, most frequent first."""
+        prefix = prefix.lower().strip()
+        if not prefix:
+            return []
+        lo = bisect.bisect_left(self.sorted_terms, prefix)
+        hi = bisect.bisect_left(self.sorted_terms, prefix + "\uffff", lo)
+        if hi - lo <= n:
+            best = np.argsort(-self.sorted_df[lo:hi], kind="stable")
+        else:
+            window = -self.sorted_df[lo:hi]
+            best = np.argpartition(window, n - 1)[:n]
+            best = best[np.argsort(window[best], kind="stable")]
+        return [self.sorted_terms[lo + i] for i in best]
@@ -0,0 +1,68 @@
+"""
+Filename: test_spelling.py
+Project: AutoAssist - Vehicle Maintenance Question Answering Tool
+Description:
+    Checks that spelling correction fixes real typos and leaves correct
+    queries alone: the evaluation queries must come through unchanged,
+    as must make and model names, capitalized words, short words and
+    inflections of indexed terms.
+
+    Usage:
+        python -m pytest -q src/test_spelling.py
+
+Author: Kunal Sinha
+Course: CS410 - Text Information Systems (Fall 2025), UIUC
+"""
+
+import os
+
+import pytest
+
+from config import INDEX_ROOT
+from spelling import SpellingIndex
+
+TERMS = {
+    "alternator": 40, "noise": 120, "carry": 15, "audio": 30, "scar": 5,
+    "wear": 60, "flows": 12, "low": 200, "rides": 4, "needs": 25,
+    "diagram": 80, "transmission": 150, "fluid": 140, "coolant": 70,
+    "sensor": 300, "caliper": 35, "cable": 50, "table": 48, "rise": 6,
+    "blower": 20,
+}
+
+
+@pytest.fixture(scope="module")
+def index():
+    return SpellingIndex(list(TERMS), list(TERMS.values()))
+
+
+def test_fixes_typos(index):
+    corrected, corrections = index.correct_query("camry alternater noise")
+    assert corrected == "camry alternator noise"
+    assert corrections == {"alternater": "alternator"}
+    assert index.correct_query("transmision fluid")[0] == "transmission fluid"
+
+
+@pytest.mark.parametrize("word", [
+    "camry", "Audi", "scan", "weak", "slow", "need",   # names and short words
+    "blows", "rises", "diagrams", "Camry",             # inflections, capitals
+])
+def test_leaves_words_alone(index, word):
+    assert index.correct_query(word) == (word, {})
+
+
+def test_ambiguous_correction_is_skipped(index):
+    # "xable" is one edit from both "cable" and "table", which are about
+    # equally frequent
+    assert index.correct("cabke") == "cable"
+    assert index.correct("xable") == "xable"
+
+
+@pytest.mark.skipif(not os.path.exists(os.path.join(INDEX_ROOT, "CURRENT")),
+                    reason="no index built")
+def test_evaluation_queries_unchanged():
+    from search_engine import correct_query
+    from evaluate import TEST_QUERIES
+
+    for query in TEST_QUERIES:
+        for text in (query, query.lower()):
+            assert correct_query(text) == (text, {})
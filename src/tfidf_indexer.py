@@ -8,26 +8,74 @@ Description:
     metadata to disk for fast querying.
 
     This script loads the segmented passages stored under data/corpus/<make>/passages,
-    builds a unified TF-IDF index, and saves three artifacts:
+    builds a unified TF-IDF index, and publishes it as a new index generation
+    (see index_store.py) containing:
 
         - vectorizer.pkl     (TF-IDF vocabulary + weighting)
-        - tfidf_matrix.pkl   (matrix of passage vectors)
+        - query_vectorizer.json, vocabulary.txt, idf.npy
+                             (the same, readable without scikit-learn)
+        - tfidf_data.npy, tfidf_indices.npy, tfidf_indptr.npy
+                             (CSR matrix of passage vectors, memory-mappable)
+        - tfidf_scale.npy    (per-row scale, only for quantized matrices)
         - metadata.pkl       (list of metadata dictionaries, one per passage)
+        - page_ids.npy       (int32 page id per passage, for result grouping)
+        - make_codes.npy     (int16 make code per passage, for make boosting)
+        - make_labels.npy    (make name for each make code)
+        - passage_weights.npy (float32 score weight per passage, by page type)
+        - source_codes.npy   (int32 source PDF code per passage)
+        - source_labels.npy  (source PDF name for each source code)
+        - model_codes.npy    (int32 model code per passage, for facet counts)
+        - model_labels.npy   (model name for each model code)
 
     A unique doc_id is added for each passage so the system can compute
     evaluation metrics such as Precision@k and Recall@k. 
 
+    --dtype stores the matrix weights as float32, or quantized to
+    uint16/uint8 with a scale per row, instead of float64. Before such
+    an index is published, the top-k results of the evaluate.py queries
+    are compared with the float64 ranking, and the build is rejected if
+    the overlap drops below --min-overlap.
+
+    With --jobs N (default: one per CPU) the vectorizer is fitted over
+    one chunk of passages per worker process (see build_tfidf).
+
+    --compact publishes a copy of the current generation without the
+    passages tombstoned by manual_tools.remove_manual(), reusing its
+    vocabulary and idf instead of refitting them.
+
+    Usage:
+        python src/tfidf_indexer.py
+        python src/tfidf_indexer.py --jobs 8
+        python src/tfidf_indexer.py --compact
+        python src/tfidf_indexer.py --dtype uint8 --min-overlap 0.9
+
 Author: Kunal Sinha
 Course: CS410 - Text Information Systems (Fall 2025), UIUC
 """
 
 import os
 import json
+import time
 import pickle
+import argparse
+import numpy as np
 from tqdm import tqdm
 from sklearn.feature_extraction.text import TfidfVectorizer
 
 from config import CORPUS_ROOT, INDEX_ROOT
+import index_store
+from index_reader import (
+    read_index, manual_rows, row_manuals, export_vectorizer,
+    build_page_ids, build_make_codes, build_model_codes,
+    build_source_codes, build_passage_weights, build_doc_lengths, compact_matrix, expand_matrix,
+    MATRIX_DTYPES, SCALE_FILE
+)
+
+# Results compared per query by the compact-matrix check
+OVERLAP_TOP_K = 10
+
+# Smallest mean top-k overlap with the float64 ranking a compact index may have
+MIN_TOPK_OVERLAP = 0.9
 
 
 def collect_passage_files():
@@ -84,44 +132,297 @@ def load_passages():
     return passages, metadata
 
 
-def build_tfidf(passages):
-    """Fit a TF-IDF vectorizer and compute the document-term matrix."""
-    print("Building TF-IDF index...")
+# Settings of the TF-IDF vectorizer
+TFIDF_PARAMS = {
+    "lowercase": True,
+    "stop_words": "english",
+    "max_df": 0.95,
+    "min_df": 2,
+    "ngram_range": (1, 2),
+}
+
+# Smallest chunk worth a worker task in the parallel build; below this,
+# process start-up and pickling outweigh the work
+MIN_BUILD_CHUNK = 1000
+
+# Vectorizer of the worker processes (set once by _init_worker)
+_worker_vectorizer = None
+
+
+def _chunk_doc_freq(texts):
+    """Number of passages of `texts` containing each term."""
+    analyze = TfidfVectorizer(**TFIDF_PARAMS).build_analyzer()
+    doc_freq = {}
+    for text in texts:
+        for term in set(analyze(text)):
+            doc_freq[term] = doc_freq.get(term, 0) + 1
+    return doc_freq
+
+
+def _init_worker(vectorizer):
+    global _worker_vectorizer
+    _worker_vectorizer = vectorizer
+
+
+def _chunk_transform(texts):
+    return _worker_vectorizer.transform(texts)
+
+
+def _frozen_vectorizer(doc_freq, n_docs):
+    """
+    TfidfVectorizer with the vocabulary and idf that fit() would derive
+    from these document frequencies (same df limits, column order and
+    smoothed idf), without another pass over the passages.
+    """
+    vectorizer = TfidfVectorizer(**TFIDF_PARAMS)
+    max_df, min_df = TFIDF_PARAMS["max_df"], TFIDF_PARAMS["min_df"]
+    high = max_df if isinstance(max_df, int) else max_df * n_docs
+    low = min_df if isinstance(min_df, int) else min_df * n_docs
 
-    vectorizer = TfidfVectorizer(
-        lowercase=True,
-        stop_words="english",
-        max_df=0.95,
-        min_df=2,
-        ngram_range=(1, 2)
-    )
+    terms = sorted(t for t, df in doc_freq.items() if low <= df <= high)
+    if not terms:
+        raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+    df = np.array([doc_freq[t] for t in terms], dtype=np.float64)
 
-    tfidf_matrix = vectorizer.fit_transform(passages)
+    vectorizer.vocabulary_ = {t: i for i, t in enumerate(terms)}
+    vectorizer.fixed_vocabulary_ = False
+    vectorizer.idf_ = np.log((n_docs + 1) / (df + 1)) + 1
+    return vectorizer
 
-    print("TF-IDF matrix shape:", tfidf_matrix.shape)
+
+def build_tfidf(passages, jobs=None):
+    """
+    Fit a TF-IDF vectorizer and compute the document-term matrix.
+
+    With jobs > 1 (default: one per CPU) the passages are split into one
+    chunk per worker, at least MIN_BUILD_CHUNK passages each, and the
+    build runs in two passes over a pool of worker processes: document
+    frequencies are counted per chunk and merged into the vocabulary and
+    idf, then every chunk is transformed with that frozen vocabulary and
+    the rows are stacked. The result is the same as
+    TfidfVectorizer.fit_transform over all passages, which is what a
+    single worker runs.
+    """
+    from scipy.sparse import vstack
+
+    print("Building TF-IDF index...")
+    jobs = jobs or os.cpu_count() or 1
+    chunk = max(MIN_BUILD_CHUNK, -(-len(passages) // jobs))
+    chunks = [passages[i:i + chunk] for i in range(0, len(passages), chunk)]
+    jobs = min(jobs, len(chunks))
+
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            partial_freqs = list(pool.map(_chunk_doc_freq, chunks))
+        doc_freq = partial_freqs[0]
+        for partial in partial_freqs[1:]:
+            for term, count in partial.items():
+                doc_freq[term] = doc_freq.get(term, 0) + count
+        vectorizer = _frozen_vectorizer(doc_freq, len(passages))
+
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(vectorizer,)) as pool:
+            parts = list(pool.map(_chunk_transform, chunks))
+        tfidf_matrix = vstack(parts, format="csr")
+    else:
+        vectorizer = TfidfVectorizer(**TFIDF_PARAMS)
+        tfidf_matrix = vectorizer.fit_transform(passages)
+
+    print(f"TF-IDF matrix shape: {tfidf_matrix.shape} ({jobs} worker{'s' if jobs > 1 else ''})")
     return vectorizer, tfidf_matrix
 
 
-def save_index(vectorizer, tfidf_matrix, metadata):
-    """Write the artifacts to disk under data/corpus/index/."""
+def topk_overlap(vectorizer, reference, compact, weights, k=OVERLAP_TOP_K):
+    """
+    Mean share of the top-k passages of `reference` that `compact` also
+    ranks in its top-k, over the evaluate.py test queries.
+    """
+    from query_normalizer import normalize_query
+    from evaluate import TEST_QUERIES
+
+    overlaps = []
+    for query in TEST_QUERIES:
+        query_vec = vectorizer.transform([normalize_query(query)])
+        top = []
+        for matrix in (reference, compact):
+            scores = (matrix @ query_vec.astype(matrix.dtype).T).toarray().ravel() * weights
+            k_eff = min(k, int(np.count_nonzero(scores)))
+            top.append(set(np.argsort(-scores, kind="stable")[:k_eff].tolist()))
+        if top[0]:
+            overlaps.append(len(top[0] & top[1]) / len(top[0]))
+    return float(np.mean(overlaps)) if overlaps else 1.0
+
+
+def carry_tombstones(snapshot, generation, index_dir):
+    """
+    Tombstone in a new generation the manuals removed from the snapshot's
+    index after the snapshot was taken. The build read their passages
+    before they were removed, so without this they would come back when
+    it is published. Manuals removed earlier are not in the build at all,
+    and one added again since then stays visible. Returns the number of
+    rows tombstoned.
+    """
+    old_generation, old_dir, before = snapshot
+    try:
+        now = np.load(index_store.tombstone_path(old_generation, INDEX_ROOT))
+    except FileNotFoundError:
+        return 0
+
+    removed = np.unpackbits(now).astype(bool)
+    if before is not None:
+        removed[:before.size * 8] &= ~np.unpackbits(before).astype(bool)
+    rows = np.flatnonzero(removed)
+    if not rows.size:
+        return 0
+
+    carried = 0
+    for make, source_pdf in row_manuals(old_dir, rows):
+        new_rows, n_rows = manual_rows(index_dir, make, source_pdf)
+        if new_rows.size:
+            carried += index_store.add_tombstones(generation, new_rows, n_rows, INDEX_ROOT)
+    return carried
+
+
+def save_index(vectorizer, tfidf_matrix, metadata, build_seconds=None,
+               dtype="float64", min_overlap=MIN_TOPK_OVERLAP, snapshot=None):
+    """
+    Write the artifacts into a fresh generation directory under
+    data/corpus/index/ and atomically publish it. Searches running
+    meanwhile keep using the previous generation until the switch.
+
+    With a compact `dtype`, nothing is written unless the top-k overlap
+    with the float64 matrix is at least `min_overlap`. `snapshot`
+    (index_store.tombstone_snapshot() from when the build started) lets
+    manuals removed during the build stay removed.
+    """
+    tfidf_matrix = tfidf_matrix.tocsr()
+    data, indices, indptr, scale = compact_matrix(tfidf_matrix, dtype)
+    weights = build_passage_weights(metadata)
+
+    overlap = None
+    if dtype != "float64":
+        compact = expand_matrix(data, indices, indptr, scale, tfidf_matrix.shape)
+        overlap = topk_overlap(vectorizer, tfidf_matrix, compact, weights)
+        print(f"Top-{OVERLAP_TOP_K} overlap with float64 ranking ({dtype}): {overlap:.3f}")
+        if overlap < min_overlap:
+            raise SystemExit(f"Overlap below {min_overlap}; index not published.")
+
     os.makedirs(INDEX_ROOT, exist_ok=True)
+    out_dir = index_store.new_build_dir(INDEX_ROOT)
 
-    with open(os.path.join(INDEX_ROOT, "vectorizer.pkl"), "wb") as f:
+    with open(os.path.join(out_dir, "vectorizer.pkl"), "wb") as f:
         pickle.dump(vectorizer, f)
+    # Vocabulary, idf and analyzer settings, so searching never unpickles sklearn
+    export_vectorizer(vectorizer, out_dir)
 
-    with open(os.path.join(INDEX_ROOT, "tfidf_matrix.pkl"), "wb") as f:
-        pickle.dump(tfidf_matrix, f)
+    # Raw CSR arrays instead of a pickle, so readers can memory-map them
+    np.save(os.path.join(out_dir, "tfidf_data.npy"), data)
+    np.save(os.path.join(out_dir, "tfidf_indices.npy"), indices)
+    np.save(os.path.join(out_dir, "tfidf_indptr.npy"), indptr)
+    if scale is not None:
+        np.save(os.path.join(out_dir, SCALE_FILE), scale)
 
-    with open(os.path.join(INDEX_ROOT, "metadata.pkl"), "wb") as f:
+    with open(os.path.join(out_dir, "metadata.pkl"), "wb") as f:
         pickle.dump(metadata, f)
 
-    print("Index successfully saved.")
+    make_codes, make_labels = build_make_codes(metadata)
+    np.save(os.path.join(out_dir, "page_ids.npy"), build_page_ids(metadata))
+    np.save(os.path.join(out_dir, "make_codes.npy"), make_codes)
+    np.save(os.path.join(out_dir, "make_labels.npy"), make_labels)
+    np.save(os.path.join(out_dir, "passage_weights.npy"), weights)
+    np.save(os.path.join(out_dir, "doc_lengths.npy"), build_doc_lengths(metadata))
+    source_codes, source_labels = build_source_codes(metadata)
+    np.save(os.path.join(out_dir, "source_codes.npy"), source_codes)
+    np.save(os.path.join(out_dir, "source_labels.npy"), source_labels)
+    model_codes, model_labels = build_model_codes(metadata)
+    np.save(os.path.join(out_dir, "model_codes.npy"), model_codes)
+    np.save(os.path.join(out_dir, "model_labels.npy"), model_labels)
+
+    # Removals made so far are tombstoned before the switch, and any that
+    # land on the previous generation during it right after
+    carried = 0
+    if snapshot is not None:
+        generation = os.path.basename(out_dir).replace(".build-", "", 1)
+        carried = carry_tombstones(snapshot, generation, out_dir)
+
+    generation = index_store.publish(out_dir, {
+        "passages": int(tfidf_matrix.shape[0]),
+        "vocabulary": int(tfidf_matrix.shape[1]),
+        "nnz": int(tfidf_matrix.nnz),
+        "matrix_dtype": dtype,
+        "matrix_bytes": int(data.nbytes + indices.nbytes + indptr.nbytes
+                            + (scale.nbytes if scale is not None else 0)),
+        "topk_overlap": round(overlap, 4) if overlap is not None else None,
+        "build_seconds": round(build_seconds, 3) if build_seconds is not None else None,
+    }, index_root=INDEX_ROOT)
+    if snapshot is not None:
+        carried += carry_tombstones(snapshot, generation,
+                                    index_store.generation_dir(generation, INDEX_ROOT))
+
+    print(f"Index successfully saved (generation {generation}).")
+    if carried:
+        print(f"{carried} passages of manuals removed during the build stay hidden.")
+
+
+def build_index(dtype="float64", min_overlap=MIN_TOPK_OVERLAP, jobs=None):
+    """Load all passages, fit TF-IDF and publish a new index generation."""
+    start = time.perf_counter()
+    snapshot = index_store.tombstone_snapshot(INDEX_ROOT)
+    passages, metadata = load_passages()
+    vectorizer, tfidf_matrix = build_tfidf(passages, jobs)
+    save_index(vectorizer, tfidf_matrix, metadata, time.perf_counter() - start,
+               dtype, min_overlap, snapshot)
+
+
+def compact_index():
+    """
+    Drop tombstoned passages from the published index by writing a new
+    generation with only the live rows. Vocabulary and idf are kept as
+    they are (a full build refreshes them). Returns the number of rows
+    dropped.
+    """
+    # Rows removed after this snapshot are carried over by save_index
+    snapshot = generation, index_dir, bits = index_store.tombstone_snapshot(INDEX_ROOT)
+    state = read_index(index_dir, generation)
+    n_rows = state["tfidf_matrix"].shape[0]
+    deleted = np.unpackbits(bits, count=n_rows).astype(bool) if bits is not None else None
+    if deleted is None or not deleted.any():
+        print("No removed passages to compact.")
+        return 0
+
+    start = time.perf_counter()
+    keep = np.flatnonzero(~deleted)
+    with open(os.path.join(index_dir, "vectorizer.pkl"), "rb") as f:
+        vectorizer = pickle.load(f)
+    dtype = "float64"
+    if generation is not None:
+        dtype = index_store.read_manifest(generation, INDEX_ROOT).get("matrix_dtype", dtype)
+
+    print(f"Compacting: dropping {n_rows - keep.size} of {n_rows} passages...")
+    # The stored matrix is already the compact one, so no overlap check
+    save_index(vectorizer, state["tfidf_matrix"][keep], [state["metadata"][i] for i in keep],
+               time.perf_counter() - start, dtype, min_overlap=0.0, snapshot=snapshot)
+    return n_rows - int(keep.size)
 
 
 def main():
-    passages, metadata = load_passages()
-    vectorizer, tfidf_matrix = build_tfidf(passages)
-    save_index(vectorizer, tfidf_matrix, metadata)
+    parser = argparse.ArgumentParser(description="Build the TF-IDF index.")
+    parser.add_argument("--dtype", choices=MATRIX_DTYPES, default="float64",
+                        help="Storage type of the matrix weights (uint* = quantized per row)")
+    parser.add_argument("--min-overlap", type=float, default=MIN_TOPK_OVERLAP,
+                        help="Smallest top-k overlap with float64 a compact index may have")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Worker processes for the build (default: one per CPU)")
+    parser.add_argument("--compact", action="store_true",
+                        help="Only drop removed manuals from the current index")
+    args = parser.parse_args()
+
+    if args.compact:
+        compact_index()
+    else:
+        build_index(args.dtype, args.min_overlap, args.jobs)
 
 
 if __name__ == "__main__":